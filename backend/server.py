@@ -1,31 +1,183 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request
+from fastapi.routing import APIRoute
 from dotenv import load_dotenv
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReturnDocument, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
+import asyncio
+import json
+import base64
+import csv
+import gzip
+import hashlib
+import zlib
+import io
 import logging
+import threading
+from collections import OrderedDict, deque
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Optional, Dict, Any, Set, Tuple, Union, Iterable, get_args, get_origin
 import uuid
-from datetime import datetime
+import re
+import unicodedata
+import bisect
+import math
+import time
+import functools
+import orjson
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from contextvars import ContextVar
 from enum import Enum
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # Optional: br responses are only offered when installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd responses are only offered when installed
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: MessagePack responses are only offered when installed
+    msgpack = None
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# MongoDB command monitoring
+# Every command is timed per (collection, command). Commands slower than
+# SLOW_COMMAND_MS land in a ring buffer with the route that issued them, and
+# slow reads are explained in the background. Listener callbacks run on
+# Motor's executor threads, which receive a copy of the calling context, so
+# command_origin identifies the route.
+SLOW_COMMAND_SECONDS = float(os.environ.get('SLOW_COMMAND_MS', '100')) / 1000
+SLOW_COMMAND_BUFFER_SIZE = 100
+SLOW_COMMAND_SUMMARY_CHARS = 2000
+EXPLAIN_QUEUE_SIZE = 20
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct"}
+COMMAND_SESSION_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "$clusterTime", "$db", "$readPreference"}
+
+command_origin: ContextVar[str] = ContextVar("command_origin", default="background")
+
+
+def command_summary(command: Dict[str, Any]) -> str:
+    """Truncated JSON of a command without session fields or inserted documents"""
+    fields = {key: value for key, value in command.items() if key not in COMMAND_SESSION_FIELDS and key != "documents"}
+    return json.dumps(fields, default=json_default)[:SLOW_COMMAND_SUMMARY_CHARS]
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Latency histograms per (collection, command) and a ring buffer of slow commands"""
+
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str], Any] = {}
+        self.failures: Dict[Tuple[str, str], int] = {}
+        self.slow_commands: deque = deque(maxlen=SLOW_COMMAND_BUFFER_SIZE)
+        self._lock = threading.Lock()
+        self._started: Dict[Tuple[Any, int], Tuple[str, Dict[str, Any], str]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._explain_queue: Optional[asyncio.Queue] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Start handing slow reads to explain_slow_commands() on this loop"""
+        self._loop = loop
+        self._explain_queue = asyncio.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+
+    def started(self, event):
+        command = event.command
+        collection = command.get("collection" if event.command_name == "getMore" else event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (collection, command, command_origin.get())
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+    def _finished(self, event, failed: bool):
+        seconds = event.duration_micros / 1_000_000
+        with self._lock:
+            started = self._started.pop((event.connection_id, event.request_id), None)
+            if started is None:
+                return
+            collection, command, origin = started
+            key = (collection, event.command_name)
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = LatencyHistogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            if failed:
+                self.failures[key] = self.failures.get(key, 0) + 1
+        if seconds >= SLOW_COMMAND_SECONDS:
+            self._capture(event, collection, command, origin, seconds, failed)
+
+    def _capture(self, event, collection: str, command: Dict[str, Any], origin: str, seconds: float, failed: bool):
+        entry = {
+            "at": datetime.utcnow(),
+            "command": event.command_name,
+            "collection": collection,
+            "database": event.database_name,
+            "duration_ms": round(seconds * 1000, 2),
+            "route": origin,
+            "failed": failed,
+            "summary": command_summary(command),
+            "explain": None,
+        }
+        with self._lock:
+            self.slow_commands.append(entry)
+        if event.command_name in EXPLAINABLE_COMMANDS and not failed and self._loop is not None:
+            target = {key: value for key, value in command.items() if key not in COMMAND_SESSION_FIELDS}
+            self._loop.call_soon_threadsafe(self._queue_explain, entry, target, event.database_name)
+
+    def _queue_explain(self, entry: Dict[str, Any], target: Dict[str, Any], database: str):
+        try:
+            self._explain_queue.put_nowait((entry, target, database))
+        except asyncio.QueueFull:
+            entry["explain"] = {"skipped": "explain queue full"}
+
+    async def next_explain(self) -> Tuple[Dict[str, Any], Dict[str, Any], str]:
+        return await self._explain_queue.get()
+
+    def snapshot(self) -> Tuple[List[Dict[str, Any]], Dict[Tuple[str, str], Any], Dict[Tuple[str, str], int]]:
+        with self._lock:
+            return list(self.slow_commands), dict(self.latency), dict(self.failures)
+
+
+command_monitor = CommandMonitor()
+
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[command_monitor])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
-app = FastAPI(title="TEIA - Algarve Autism Friendly API", version="1.0.0")
+app = FastAPI(
+    title="TEIA - Algarve Autism Friendly API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Long-running tasks started on startup and cancelled on shutdown
+background_tasks: List[asyncio.Task] = []
+
 
 # Enums
 class EstablishmentType(str, Enum):
@@ -139,97 +291,3107 @@ class Establishment(BaseModel):
     average_rating: float = 0.0
     autism_rating: float = 0.0  # Special rating for autism-friendliness
     images: List[str] = []  # Base64 encoded images
+    municipality: Optional[str] = None  # Assigned from coordinates on write
+    external_id: Optional[str] = None  # Partner's key, used to upsert bulk imports
+    event_start: Optional[datetime] = None  # Only for EstablishmentType.EVENT
+    event_end: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class EstablishmentCreate(BaseModel):
+    name: str
+    type: EstablishmentType
+    description: str
+    address: str
+    coordinates: Dict[str, float]
+    accessibility_features: List[AccessibilityFeature] = []
+    contact_info: Dict[str, str] = {}
+    opening_hours: Dict[str, str] = {}
+    special_hours: List[str] = []
+    sensory_info: Dict[str, Any] = {}
+    images: List[str] = []
+    event_start: Optional[datetime] = None
+    event_end: Optional[datetime] = None
+
+
+class EstablishmentUpdate(BaseModel):
+    name: Optional[str] = None
+    type: Optional[EstablishmentType] = None
+    description: Optional[str] = None
+    address: Optional[str] = None
+    coordinates: Optional[Dict[str, float]] = None
+    accessibility_features: Optional[List[AccessibilityFeature]] = None
+    certified_autism_friendly: Optional[bool] = None
+    certification_date: Optional[datetime] = None
+    contact_info: Optional[Dict[str, str]] = None
+    opening_hours: Optional[Dict[str, str]] = None
+    special_hours: Optional[List[str]] = None
+    sensory_info: Optional[Dict[str, Any]] = None
+    images: Optional[List[str]] = None
+    event_start: Optional[datetime] = None
+    event_end: Optional[datetime] = None
+
+
+class ReviewCreate(BaseModel):
+    user_id: str
+    rating: int = Field(ge=1, le=5)
+    noise_level: SensoryLevel
+    lighting_level: SensoryLevel
+    visual_clarity: SensoryLevel
+    staff_helpfulness: int = Field(ge=1, le=5)
+    calm_areas_available: bool
+    comment: str = ""
+
+
+class Review(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    establishment_id: str
+    user_id: str
+    user_name: str = ""
+    rating: int = Field(ge=1, le=5)
+    noise_level: SensoryLevel
+    lighting_level: SensoryLevel
+    visual_clarity: SensoryLevel
+    staff_helpfulness: int = Field(ge=1, le=5)
+    calm_areas_available: bool
+    comment: str = ""
+    status: str = "pending"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    approved_at: Optional[datetime] = None
+    approved_by: Optional[str] = None  # Admin user ID
+
+
+class ReviewModerationAction(str, Enum):
+    APPROVE = "approve"
+    REJECT = "reject"
+
+
+class BulkReviewModeration(BaseModel):
+    action: ReviewModerationAction
+    review_ids: List[str] = []
+    # Alternatively select reviews by filter
+    status: Optional[ReviewStatus] = None
+    establishment_id: Optional[str] = None
+    created_before: Optional[datetime] = None
+    admin_user_id: str = "admin"
+    limit: int = Field(default=1000, ge=1, le=10000)
+
+
+class Partner(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    logo_url: str
+    website_url: str = ""
+    description: str = ""
+    is_active: bool = True
+    display_order: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
-class EstablishmentCreate(BaseModel):
-    name: str
-    type: EstablishmentType
-    description: str
-    address: str
-    coordinates: Dict[str, float]
-    accessibility_features: List[AccessibilityFeature] = []
-    contact_info: Dict[str, str] = {}
-    opening_hours: Dict[str, str] = {}
-    special_hours: List[str] = []
-    sensory_info: Dict[str, Any] = {}
-    images: List[str] = []
+class PartnerCreate(BaseModel):
+    name: str
+    logo_url: str
+    website_url: str = ""
+    description: str = ""
+    is_active: bool = True
+    display_order: int = 0
+
+
+class PartnerUpdate(BaseModel):
+    name: Optional[str] = None
+    logo_url: Optional[str] = None
+    website_url: Optional[str] = None
+    description: Optional[str] = None
+    is_active: Optional[bool] = None
+    display_order: Optional[int] = None
+
+
+# Opening hours index
+# Hours are stored as minute-of-week intervals [start, end) where minute 0 is
+# Monday 00:00 in Algarve local time.
+LOCAL_TZ = ZoneInfo("Europe/Lisbon")
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+DAYS_OF_WEEK = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+# Day names and abbreviations (English and Portuguese), as regex alternatives per weekday.
+# "Quinta do Lago" and similar place names are not Thursdays.
+DAY_NAMES = [
+    r"mondays?|segunda(?:s|[- ]feira)?|mon|seg",
+    r"tuesdays?|ter[çc]a(?:s|[- ]feira)?|tues?|ter",
+    r"wednesdays?|quarta(?:s|[- ]feira)?|wed|qua",
+    r"thursdays?|quinta(?:s|[- ]feira)?(?!\s+d[aoe]s?\b)|thu(?:rs?)?|qui",
+    r"fridays?|sexta(?:s|[- ]feira)?|fri|sex",
+    r"saturdays?|s[áa]bados?|sat|s[áa]b",
+    r"sundays?|domingos?|sun|dom",
+]
+DAY_ABBREVIATIONS = {"mon", "seg", "tue", "tues", "ter", "wed", "qua", "thu", "thur", "thurs", "qui",
+                     "fri", "sex", "sat", "sab", "sáb", "sun", "dom"}
+DAY_NAME_PATTERNS = [(index, re.compile(rf"(?:{names})", re.IGNORECASE)) for index, names in enumerate(DAY_NAMES)]
+_DAY_NAME = "|".join(f"(?:{names})" for names in DAY_NAMES)
+# "Mon-Fri", "Segunda a Sexta", "Sat to Mon" (wrapping), or a single day
+DAY_RANGE_RE = re.compile(
+    rf"\b({_DAY_NAME})\b\.?(?:\s*(?:-|–|\bto\b|\bthrough\b|\bthru\b|\ba\b|\bà\b|\baté\b)\s*\b({_DAY_NAME})\b\.?)?",
+    re.IGNORECASE,
+)
+# An abbreviation only counts as a day when punctuation, a time or another day follows it ("Dom Pedro", "ter ruído")
+DAY_ABBREVIATION_END_RE = re.compile(rf"\s*(?:[,;:/&\-–(]|\d|$|(?:e|and)\s+(?:{_DAY_NAME})\b)", re.IGNORECASE)
+DAY_GROUP_PATTERNS = [
+    (range(5), re.compile(r"\b(weekdays|dias [úu]teis)\b", re.IGNORECASE)),
+    ((5, 6), re.compile(r"\b(weekends?|fins? de semana)\b", re.IGNORECASE)),
+]
+# Schedules the weekly index cannot represent: holidays, dates, months, nth weekdays, exceptions
+UNSUPPORTED_SCHEDULE_RE = re.compile(
+    r"\b(feriados?|holidays?|primeir[oa]s?|[úu]ltim[oa]s?|first|last|every other|except|exceto|excepto|excluding"
+    r"|janeiro|fevereiro|março|marco|abril|maio|junho|julho|agosto|setembro|outubro|novembro|dezembro"
+    r"|january|february|march|april|june|july|august|september|october|november|december)\b"
+    r"|\b\d{1,2}/\d{1,2}\b",
+    re.IGNORECASE,
+)
+
+TIME_RANGE_RE = re.compile(r"(\d{1,2})[:h](\d{2})\s*[-–]\s*(\d{1,2})[:h](\d{2})")
+ALL_DAY_RE = re.compile(r"^\s*(24h|24 ?horas|24 ?hours|00:00\s*-\s*24:00)\s*$", re.IGNORECASE)
+
+
+def parse_time_ranges(text: str) -> List[Tuple[int, int]]:
+    """Parse "09:00-13:00, 14:00-18:00" style text into minute-of-day ranges"""
+    if ALL_DAY_RE.match(text or ""):
+        return [(0, MINUTES_PER_DAY)]
+
+    ranges = []
+    for start_h, start_m, end_h, end_m in TIME_RANGE_RE.findall(text or ""):
+        start = int(start_h) * 60 + int(start_m)
+        end = int(end_h) * 60 + int(end_m)
+        if start >= MINUTES_PER_DAY or end > MINUTES_PER_DAY:
+            continue
+        if end <= start:
+            # Overnight range such as "20:00-08:00" continues into the next day
+            end += MINUTES_PER_DAY
+        ranges.append((start, end))
+    return ranges
+
+
+def merge_intervals(intervals: List[Tuple[int, int]]) -> List[List[int]]:
+    """Normalize minute-of-week intervals: wrap at week end, sort and merge"""
+    wrapped = []
+    for start, end in intervals:
+        if end > MINUTES_PER_WEEK:
+            wrapped.append((start, MINUTES_PER_WEEK))
+            wrapped.append((0, end - MINUTES_PER_WEEK))
+        else:
+            wrapped.append((start, end))
+
+    merged: List[List[int]] = []
+    for start, end in sorted(wrapped):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def parse_opening_hours(opening_hours: Dict[str, str]) -> List[List[int]]:
+    """Convert the day_of_week -> "09:00-18:00" dict into weekly intervals"""
+    intervals = []
+    for day, text in (opening_hours or {}).items():
+        day_key = day.strip().lower()
+        if day_key not in DAYS_OF_WEEK:
+            continue
+        day_offset = DAYS_OF_WEEK.index(day_key) * MINUTES_PER_DAY
+        for start, end in parse_time_ranges(text):
+            intervals.append((day_offset + start, day_offset + end))
+    return merge_intervals(intervals)
+
+
+def weekday_from_name(name: str) -> int:
+    return next(index for index, pattern in DAY_NAME_PATTERNS if pattern.fullmatch(name))
+
+
+def parse_days(text: str) -> Set[int]:
+    """Weekdays named in text: single days, ranges ("Mon-Fri", "Segunda a Sexta") and weekdays/weekends"""
+    days: Set[int] = set()
+    for match in DAY_RANGE_RE.finditer(text):
+        first, last = match.group(1), match.group(2)
+        if last is None and first.lower() in DAY_ABBREVIATIONS and not DAY_ABBREVIATION_END_RE.match(text, match.end()):
+            continue
+        start = weekday_from_name(first)
+        end = start if last is None else weekday_from_name(last)
+        days.update((start + offset) % 7 for offset in range((end - start) % 7 + 1))
+    for group, pattern in DAY_GROUP_PATTERNS:
+        if pattern.search(text):
+            days.update(group)
+    return days
+
+
+def parse_special_hours(special_hours: List[str]) -> List[List[int]]:
+    """Extract autism-friendly (quiet) hours from free-text special hours.
+
+    Entries naming days ("Segunda a Sexta 09:00-11:00", "Sat 08:00-10:00") apply
+    to those days only, entries without a day ("Quiet hours: 20:00-08:00") apply
+    every day. Entries tied to dates, holidays or nth weekdays are left out
+    rather than indexed as every week.
+    """
+    intervals = []
+    for text in special_hours or []:
+        ranges = parse_time_ranges(text)
+        if not ranges or UNSUPPORTED_SCHEDULE_RE.search(text):
+            continue
+        days = sorted(parse_days(text))
+        for day_index in days or range(7):
+            day_offset = day_index * MINUTES_PER_DAY
+            for start, end in ranges:
+                intervals.append((day_offset + start, day_offset + end))
+    return merge_intervals(intervals)
+
+
+def build_hours_index(establishment: Dict[str, Any]) -> Dict[str, List[List[int]]]:
+    """Compact representation of opening and quiet hours stored on the document"""
+    return {
+        "open": parse_opening_hours(establishment.get("opening_hours", {})),
+        "quiet": parse_special_hours(establishment.get("special_hours", [])),
+    }
+
+
+def minute_of_week(moment: datetime) -> int:
+    """Minute of the week in Algarve local time (naive datetimes are local)"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(LOCAL_TZ)
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+class WeeklyIntervalIndex:
+    """In-memory index of weekly intervals bucketed by hour of the week"""
+
+    BUCKET_MINUTES = 60
+
+    def __init__(self):
+        self._intervals: Dict[str, List[List[int]]] = {}
+        self._buckets: List[Set[str]] = [
+            set() for _ in range(MINUTES_PER_WEEK // self.BUCKET_MINUTES)
+        ]
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def set(self, key: str, intervals: List[List[int]]):
+        self.remove(key)
+        if not intervals:
+            return
+        self._intervals[key] = intervals
+        for start, end in intervals:
+            for bucket in range(start // self.BUCKET_MINUTES, (end - 1) // self.BUCKET_MINUTES + 1):
+                self._buckets[bucket].add(key)
+
+    def remove(self, key: str):
+        intervals = self._intervals.pop(key, None)
+        if not intervals:
+            return
+        for start, end in intervals:
+            for bucket in range(start // self.BUCKET_MINUTES, (end - 1) // self.BUCKET_MINUTES + 1):
+                self._buckets[bucket].discard(key)
+
+    def at(self, minute: int) -> Set[str]:
+        """Keys whose intervals contain the given minute of the week"""
+        matches = set()
+        for key in self._buckets[minute // self.BUCKET_MINUTES]:
+            intervals = self._intervals[key]
+            position = bisect.bisect_right(intervals, [minute, MINUTES_PER_WEEK]) - 1
+            if position >= 0 and intervals[position][0] <= minute < intervals[position][1]:
+                matches.add(key)
+        return matches
+
+
+open_hours_index = WeeklyIntervalIndex()
+quiet_hours_index = WeeklyIntervalIndex()
+
+
+def index_establishment_hours(establishment_id: str, hours_index: Dict[str, List[List[int]]]):
+    open_hours_index.set(establishment_id, hours_index.get("open", []))
+    quiet_hours_index.set(establishment_id, hours_index.get("quiet", []))
+
+
+def unindex_establishment_hours(establishment_id: str):
+    open_hours_index.remove(establishment_id)
+    quiet_hours_index.remove(establishment_id)
+
+
+async def load_hours_index():
+    """Build the in-memory hours index, rewriting stored ones that are missing or parsed by older rules"""
+    cursor = db.establishments.find(
+        {}, {"_id": 0, "id": 1, "opening_hours": 1, "special_hours": 1, "hours_index": 1}
+    )
+    async for est in cursor:
+        hours_index = build_hours_index(est)
+        if hours_index != est.get("hours_index"):
+            await db.establishments.update_one(
+                {"id": est["id"]}, {"$set": {"hours_index": hours_index}}
+            )
+        index_establishment_hours(est["id"], hours_index)
+
+
+# Upcoming events index
+EVENT_INDEX_WINDOW = timedelta(days=365)
+EVENTS_MAX_LIMIT = 500
+EARTH_RADIUS_KM = 6371.0
+
+
+def to_naive_utc(moment: datetime) -> datetime:
+    """Normalize datetimes to the naive UTC form stored in MongoDB"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class UpcomingEventsIndex:
+    """In-memory index of events that have not ended yet, within the upcoming window.
+
+    Events are kept sorted by start (for range queries) and by end (so expired
+    events are dropped from the front without scanning).
+    """
+
+    def __init__(self):
+        self._events: Dict[str, Tuple[datetime, datetime, Dict[str, float]]] = {}
+        self._by_start: List[Tuple[datetime, str]] = []
+        self._by_end: List[Tuple[datetime, str]] = []
+        self.horizon: Optional[datetime] = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def set(self, key: str, start: datetime, end: datetime, coordinates: Dict[str, float]):
+        self.remove(key)
+        if self.horizon is not None and start > self.horizon:
+            return
+        self._events[key] = (start, end, coordinates or {})
+        bisect.insort(self._by_start, (start, key))
+        bisect.insort(self._by_end, (end, key))
+
+    def remove(self, key: str):
+        event = self._events.pop(key, None)
+        if event is None:
+            return
+        start, end, _ = event
+        del self._by_start[bisect.bisect_left(self._by_start, (start, key))]
+        del self._by_end[bisect.bisect_left(self._by_end, (end, key))]
+
+    def prune(self, now: datetime):
+        """Drop events that ended before now"""
+        while self._by_end and self._by_end[0][0] < now:
+            self.remove(self._by_end[0][1])
+
+    def covers(self, end: datetime) -> bool:
+        return self.horizon is not None and end <= self.horizon
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Tuple[str, Dict[str, float]]]:
+        """Events overlapping [start, end], ordered by start"""
+        upper = bisect.bisect_right(self._by_start, (end, "\uffff"))
+        return [
+            (key, self._events[key][2])
+            for _, key in self._by_start[:upper]
+            if self._events[key][1] >= start
+        ]
+
+
+upcoming_events_index = UpcomingEventsIndex()
+
+
+def index_event(establishment: Dict[str, Any]):
+    """Add or refresh an establishment in the events index"""
+    if establishment.get("type") != EstablishmentType.EVENT or not establishment.get("event_start"):
+        upcoming_events_index.remove(establishment["id"])
+        return
+    upcoming_events_index.set(
+        establishment["id"],
+        establishment["event_start"],
+        establishment.get("event_end") or establishment["event_start"],
+        establishment.get("coordinates", {}),
+    )
+
+
+async def load_events_index():
+    """Load events that have not ended and start within the index window"""
+    now = datetime.utcnow()
+    upcoming_events_index.horizon = now + EVENT_INDEX_WINDOW
+    cursor = db.establishments.find(
+        {
+            "type": EstablishmentType.EVENT,
+            "event_end": {"$gte": now},
+            "event_start": {"$lte": upcoming_events_index.horizon},
+        },
+        {"_id": 0, "id": 1, "type": 1, "event_start": 1, "event_end": 1, "coordinates": 1},
+    )
+    async for est in cursor:
+        index_event(est)
+
+
+def normalize_event_times(data: Dict[str, Any], default_end: bool = True):
+    """Store event times as naive UTC and default the end to the start"""
+    for field in ("event_start", "event_end"):
+        if data.get(field) is not None:
+            data[field] = to_naive_utc(data[field])
+    if default_end and data.get("event_start") and not data.get("event_end"):
+        data["event_end"] = data["event_start"]
+    if data.get("event_start") and data.get("event_end") and data["event_end"] < data["event_start"]:
+        raise HTTPException(status_code=400, detail="event_end must not be before event_start")
+
+
+# Itinerary planning
+SENSORY_LEVEL_ORDER = [level.value for level in SensoryLevel]
+ITINERARY_MAX_WAIT_MINUTES = 120
+ITINERARY_MAX_CANDIDATES = 200
+
+
+class CoordinateIndex:
+    """Venue coordinates held in one array of radians; distances are computed per request.
+
+    Only the points are cached, so memory stays linear in the catalogue: a route
+    builds the matrix for its own few hundred candidates with NumPy. Removing a
+    venue moves the last point into its slot, so churn does not grow the array.
+    """
+
+    def __init__(self):
+        self._positions: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._points = np.zeros((0, 2))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def set(self, key: str, coordinates: Dict[str, float]):
+        if not coordinates or "lat" not in coordinates or "lng" not in coordinates:
+            self.remove(key)
+            return
+        position = self._positions.get(key)
+        if position is None:
+            if len(self._keys) == len(self._points):
+                points = np.zeros((max(64, 2 * len(self._points)), 2))
+                points[:len(self._keys)] = self._points[:len(self._keys)]
+                self._points = points
+            position = self._positions[key] = len(self._keys)
+            self._keys.append(key)
+        self._points[position] = np.radians((float(coordinates["lat"]), float(coordinates["lng"])))
+
+    def remove(self, key: str):
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        last_key = self._keys.pop()
+        if last_key != key:
+            self._keys[position] = last_key
+            self._positions[last_key] = position
+            self._points[position] = self._points[len(self._keys)]
+
+    @staticmethod
+    def _haversine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        d_lat = b[..., 0] - a[..., 0]
+        d_lng = b[..., 1] - a[..., 1]
+        h = np.sin(d_lat / 2) ** 2 + np.cos(a[..., 0]) * np.cos(b[..., 0]) * np.sin(d_lng / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    def _select(self, keys: List[str]) -> Tuple[List[str], np.ndarray]:
+        known = [key for key in keys if key in self._positions]
+        return known, self._points[[self._positions[key] for key in known]]
+
+    def submatrix(self, keys: List[str], origin: Tuple[float, float]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """Distances between the known keys and from the origin to each of them"""
+        known, points = self._select(keys)
+        matrix = self._haversine(points[:, None, :], points[None, :, :])
+        from_origin = self._haversine(np.radians(np.array(origin))[None, :], points)
+        return known, matrix, from_origin
+
+    def nearest_to(self, origin: Tuple[float, float], keys: List[str], limit: int) -> List[str]:
+        """The limit known keys closest to origin, nearest first"""
+        known, points = self._select(keys)
+        distances = self._haversine(np.radians(np.array(origin))[None, :], points)
+        return [known[index] for index in np.argsort(distances, kind="stable")[:limit]]
+
+    def nearest(self, key: str, limit: int, max_km: float) -> List[Tuple[str, float]]:
+        """Closest other keys within max_km, nearest first"""
+        position = self._positions.get(key)
+        if position is None:
+            return []
+        distances = self._haversine(self._points[position][None, :], self._points[:len(self._keys)])
+        distances[position] = np.inf
+        within = np.flatnonzero(distances <= max_km)
+        closest = within[np.argsort(distances[within], kind="stable")][:limit]
+        return [(self._keys[index], float(distances[index])) for index in closest]
+
+
+coordinate_index = CoordinateIndex()
+
+
+async def load_coordinate_index():
+    cursor = db.establishments.find({}, {"_id": 0, "id": 1, "coordinates": 1})
+    async for est in cursor:
+        coordinate_index.set(est["id"], est.get("coordinates", {}))
+
+
+def earliest_visit_start(open_intervals: List[List[int]], arrival: int, duration: int) -> Optional[int]:
+    """First minute-of-week >= arrival at which a visit of `duration` fits inside the opening hours"""
+    if not open_intervals:
+        return arrival  # No parsed hours: treat as unconstrained
+    for offset in (0, MINUTES_PER_WEEK):
+        for start, end in open_intervals:
+            start, end = start + offset, end + offset
+            visit_start = max(start, arrival)
+            if visit_start + duration <= end:
+                return visit_start if visit_start - arrival <= ITINERARY_MAX_WAIT_MINUTES else None
+    return None
+
+
+class ItineraryRequest(BaseModel):
+    start: Dict[str, float]  # {"lat": 37.0, "lng": -8.0}
+    start_time: Optional[datetime] = None
+    establishment_ids: List[str] = Field(default=[], max_length=ITINERARY_MAX_CANDIDATES)
+    type: Optional[EstablishmentType] = None
+    features: List[AccessibilityFeature] = []
+    certified_only: bool = False
+    max_noise_level: Optional[SensoryLevel] = None
+    min_autism_rating: Optional[float] = None
+    visit_minutes: int = Field(default=60, ge=0)
+    travel_speed_kmh: float = Field(default=30.0, gt=0)
+    max_stops: int = Field(default=20, ge=1, le=50)
+
+
+def schedule_route(
+    order: List[int],
+    matrix: np.ndarray,
+    from_origin: np.ndarray,
+    hours: List[List[List[int]]],
+    start_minute: int,
+    request: ItineraryRequest,
+) -> Optional[List[Tuple[int, int, float]]]:
+    """Visit start minutes and leg distances for a route order, or None if infeasible"""
+    schedule = []
+    clock = start_minute
+    previous = None
+    for stop in order:
+        leg = from_origin[stop] if previous is None else matrix[previous, stop]
+        arrival = clock + int(math.ceil(leg / request.travel_speed_kmh * 60))
+        visit_start = earliest_visit_start(hours[stop], arrival % MINUTES_PER_WEEK, request.visit_minutes)
+        if visit_start is None:
+            return None
+        visit_start += arrival - arrival % MINUTES_PER_WEEK
+        schedule.append((stop, visit_start, float(leg)))
+        clock = visit_start + request.visit_minutes
+        previous = stop
+    return schedule
+
+
+def route_distance(order: List[int], matrix: np.ndarray, from_origin: np.ndarray) -> float:
+    if not order:
+        return 0.0
+    return float(from_origin[order[0]] + sum(matrix[a, b] for a, b in zip(order, order[1:])))
+
+
+def plan_route(
+    matrix: np.ndarray,
+    from_origin: np.ndarray,
+    hours: List[List[List[int]]],
+    start_minute: int,
+    request: ItineraryRequest,
+) -> List[int]:
+    """Nearest-feasible-neighbour construction followed by 2-opt improvement"""
+    remaining = set(range(len(from_origin)))
+    order: List[int] = []
+    while remaining and len(order) < request.max_stops:
+        current = from_origin if not order else matrix[order[-1]]
+        for candidate in sorted(remaining, key=lambda stop: current[stop]):
+            if schedule_route(order + [candidate], matrix, from_origin, hours, start_minute, request):
+                order.append(candidate)
+                remaining.discard(candidate)
+                break
+        else:
+            break
+
+    improved = True
+    while improved:
+        improved = False
+        best = route_distance(order, matrix, from_origin)
+        for i in range(len(order) - 1):
+            for j in range(i + 2, len(order) + 1):
+                candidate = order[:i] + order[i:j][::-1] + order[j:]
+                distance = route_distance(candidate, matrix, from_origin)
+                if distance + 1e-9 < best and schedule_route(
+                    candidate, matrix, from_origin, hours, start_minute, request
+                ):
+                    order, best, improved = candidate, distance, True
+    return order
+
+
+def passes_sensory_threshold(establishment: Dict[str, Any], max_noise_level: Optional[SensoryLevel]) -> bool:
+    if max_noise_level is None:
+        return True
+    noise_level = establishment.get("sensory_info", {}).get("noise_level")
+    if noise_level not in SENSORY_LEVEL_ORDER:
+        return True  # Free-text or missing noise info is not excluded
+    return SENSORY_LEVEL_ORDER.index(noise_level) <= SENSORY_LEVEL_ORDER.index(max_noise_level)
+
+
+# Municipality assignment and rollup
+# Official CAOP boundaries, converted as described in data/README.md; not bundled
+MUNICIPALITIES_FILE = Path(os.environ.get('MUNICIPALITIES_FILE', ROOT_DIR / "data" / "algarve_municipalities.geojson"))
+
+
+def point_in_ring(lng: float, lat: float, ring: List[List[float]]) -> bool:
+    """Ray casting point-in-polygon test for a single GeoJSON ring"""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lng < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+class MunicipalityLocator:
+    """Point-in-polygon lookup against municipality boundaries, accelerated by a grid index.
+
+    Each grid cell lists the municipalities whose bounding box overlaps it, so a
+    lookup only runs the exact polygon test for a handful of candidates.
+    """
+
+    CELL_DEGREES = 0.05
+
+    def __init__(self):
+        self._polygons: List[Tuple[str, List[List[List[List[float]]]]]] = []
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+
+    def __len__(self):
+        return len(self._polygons)
+
+    def load(self, path: Path):
+        with open(path, encoding="utf-8") as boundaries_file:
+            collection = json.load(boundaries_file)
+        self._polygons = []
+        self._grid = {}
+        for feature in collection.get("features", []):
+            geometry = feature["geometry"]
+            polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+            self._polygons.append((feature["properties"]["name"], polygons))
+
+        for index, (_, polygons) in enumerate(self._polygons):
+            points = [point for polygon in polygons for point in polygon[0]]
+            min_x, max_x = self._cell(min(p[0] for p in points)), self._cell(max(p[0] for p in points))
+            min_y, max_y = self._cell(min(p[1] for p in points)), self._cell(max(p[1] for p in points))
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    self._grid.setdefault((x, y), []).append(index)
+
+    def _cell(self, value: float) -> int:
+        return int(math.floor(value / self.CELL_DEGREES))
+
+    def locate(self, coordinates: Dict[str, float]) -> Optional[str]:
+        if not coordinates or "lat" not in coordinates or "lng" not in coordinates:
+            return None
+        lat, lng = coordinates["lat"], coordinates["lng"]
+        for index in self._grid.get((self._cell(lng), self._cell(lat)), []):
+            name, polygons = self._polygons[index]
+            for polygon in polygons:
+                # First ring is the outer boundary, the rest are holes
+                if point_in_ring(lng, lat, polygon[0]) and not any(
+                    point_in_ring(lng, lat, hole) for hole in polygon[1:]
+                ):
+                    return name
+        return None
+
+
+municipality_locator = MunicipalityLocator()
+
+
+class MunicipalityRollup:
+    """Per-municipality totals maintained from per-establishment contributions"""
+
+    def __init__(self):
+        self._contributions: Dict[str, Dict[str, Any]] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+
+    def _apply(self, contribution: Dict[str, Any], sign: int):
+        municipality = contribution["municipality"]
+        if municipality is None:
+            return
+        totals = self._totals.setdefault(municipality, {
+            "establishments": 0, "certified": 0, "rated": 0, "rating_sum": 0.0, "review_count": 0,
+        })
+        totals["establishments"] += sign
+        totals["certified"] += sign * contribution["certified"]
+        totals["rated"] += sign * (contribution["autism_rating"] > 0)
+        totals["rating_sum"] += sign * contribution["autism_rating"]
+        totals["review_count"] += sign * contribution["review_count"]
+        if totals["establishments"] == 0:
+            del self._totals[municipality]
+
+    def set(self, establishment: Dict[str, Any], review_count: Optional[int] = None):
+        """Add or refresh an establishment; review_count=None keeps the tracked count"""
+        previous = self._contributions.pop(establishment["id"], None)
+        if previous is not None:
+            self._apply(previous, -1)
+            if review_count is None:
+                review_count = previous["review_count"]
+        contribution = {
+            "municipality": establishment.get("municipality"),
+            "certified": int(bool(establishment.get("certified_autism_friendly"))),
+            "autism_rating": establishment.get("autism_rating", 0.0) or 0.0,
+            "review_count": review_count or 0,
+        }
+        self._contributions[establishment["id"]] = contribution
+        self._apply(contribution, 1)
+
+    def remove(self, establishment_id: str):
+        previous = self._contributions.pop(establishment_id, None)
+        if previous is not None:
+            self._apply(previous, -1)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "municipality": municipality,
+                "establishments": int(totals["establishments"]),
+                "certified_establishments": int(totals["certified"]),
+                "average_autism_rating": round(totals["rating_sum"] / totals["rated"], 2) if totals["rated"] else 0.0,
+                "review_count": int(totals["review_count"]),
+            }
+            for municipality, totals in sorted(self._totals.items())
+        ]
+
+
+municipality_rollup = MunicipalityRollup()
+
+
+async def load_municipality_rollup():
+    """Assign municipalities from the current boundaries and build the rollup"""
+    if MUNICIPALITIES_FILE.exists():
+        municipality_locator.load(MUNICIPALITIES_FILE)
+    else:
+        logger.warning("No municipality boundaries at %s; establishments are left unassigned", MUNICIPALITIES_FILE)
+
+    approved_counts = {
+        row["_id"]: row["count"]
+        async for row in db.reviews.aggregate([
+            {"$match": {"status": ReviewStatus.APPROVED.value}},
+            {"$group": {"_id": "$establishment_id", "count": {"$sum": 1}}},
+        ])
+    }
+    cursor = db.establishments.aggregate([
+        {"$project": {
+            "_id": 0, "id": 1, "coordinates": 1, "municipality": 1,
+            "certified_autism_friendly": 1, "autism_rating": 1,
+            "embedded_reviews": {"$size": {"$ifNull": ["$reviews", []]}},
+        }}
+    ])
+    reassigned = []
+    now = datetime.utcnow()
+    async for est in cursor:
+        # Re-located on every start, so assignments follow updated boundaries
+        municipality = municipality_locator.locate(est.get("coordinates", {}))
+        if municipality_locator and municipality != est.get("municipality"):
+            est["municipality"] = municipality
+            await db.establishments.update_one(
+                {"id": est["id"]}, {"$set": {"municipality": municipality, "updated_at": now}}
+            )
+            reassigned.append((est["id"], ChangeOperation.UPDATE, now))
+        municipality_rollup.set(est, est["embedded_reviews"] + approved_counts.get(est["id"], 0))
+    await record_changes("establishment", reassigned)
+
+
+# Leaderboards
+LEADERBOARD_ALL = "all"
+LEADERBOARD_SIZE = 20
+LEADERBOARD_PERSIST_SECONDS = 60
+
+
+class Leaderboards:
+    """Establishments ranked by autism_rating per (type, municipality, certified_only), kept sorted in memory.
+
+    Each establishment appears in the boards for its type and for all types,
+    crossed with its municipality and all municipalities, and again in the
+    certified-only variants when it is certified.
+    """
+
+    def __init__(self):
+        self._boards: Dict[Tuple[str, str, bool], List[Tuple[float, str]]] = {}
+        self._entries: Dict[str, Tuple[float, List[Tuple[str, str, bool]]]] = {}
+        self._dirty: Set[Tuple[str, str, bool]] = set()
+
+    @staticmethod
+    def _board_keys(
+        establishment_type: str, municipality: Optional[str], certified: bool
+    ) -> List[Tuple[str, str, bool]]:
+        types = [establishment_type, LEADERBOARD_ALL]
+        municipalities = [municipality, LEADERBOARD_ALL] if municipality else [LEADERBOARD_ALL]
+        certified_flags = [False, True] if certified else [False]
+        return [
+            (board_type, board_municipality, certified_only)
+            for board_type in types
+            for board_municipality in municipalities
+            for certified_only in certified_flags
+        ]
+
+    def set(self, establishment: Dict[str, Any]):
+        self.remove(establishment["id"])
+        entry = (-(establishment.get("autism_rating", 0.0) or 0.0), establishment["id"])
+        keys = self._board_keys(
+            EstablishmentType(establishment["type"]).value,
+            establishment.get("municipality"),
+            bool(establishment.get("certified_autism_friendly")),
+        )
+        for key in keys:
+            board = self._boards.setdefault(key, [])
+            position = bisect.bisect_left(board, entry)
+            board.insert(position, entry)
+            if position < LEADERBOARD_SIZE:
+                self._dirty.add(key)
+        self._entries[establishment["id"]] = (entry[0], keys)
+
+    def remove(self, establishment_id: str):
+        previous = self._entries.pop(establishment_id, None)
+        if previous is None:
+            return
+        score, keys = previous
+        for key in keys:
+            board = self._boards[key]
+            position = bisect.bisect_left(board, (score, establishment_id))
+            del board[position]
+            if position < LEADERBOARD_SIZE:
+                self._dirty.add(key)
+
+    def top(
+        self, establishment_type: str, municipality: str, certified_only: bool, limit: int
+    ) -> List[Tuple[str, float]]:
+        board = self._boards.get((establishment_type, municipality, certified_only), [])
+        return [(establishment_id, -score) for score, establishment_id in board[:limit]]
+
+    def drain_dirty(self) -> Dict[Tuple[str, str, bool], List[Tuple[str, float]]]:
+        """Top entries of every board whose top changed since the last call"""
+        changed = {key: self.top(*key, LEADERBOARD_SIZE) for key in self._dirty}
+        self._dirty.clear()
+        return changed
+
+
+leaderboards = Leaderboards()
+
+
+async def load_leaderboards():
+    cursor = db.establishments.find(
+        {}, {"_id": 0, "id": 1, "type": 1, "municipality": 1,
+             "certified_autism_friendly": 1, "autism_rating": 1}
+    )
+    async for est in cursor:
+        leaderboards.set(est)
+
+
+async def persist_leaderboards():
+    """Write changed leaderboards to the leaderboards collection"""
+    for (establishment_type, municipality, certified_only), entries in leaderboards.drain_dirty().items():
+        board = {"type": establishment_type, "municipality": municipality, "certified_only": certified_only}
+        await db.leaderboards.replace_one(
+            board,
+            {
+                **board,
+                "entries": [{"id": est_id, "autism_rating": rating} for est_id, rating in entries],
+                "updated_at": datetime.utcnow(),
+            },
+            upsert=True,
+        )
+
+
+async def persist_leaderboards_periodically():
+    while True:
+        await asyncio.sleep(LEADERBOARD_PERSIST_SECONDS)
+        try:
+            await persist_leaderboards()
+        except Exception:
+            logger.exception("Failed to persist leaderboards")
+
+
+# Bulk import
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+IMPORT_KEY_FIELD = "external_id"
+IMPORT_LIST_FIELDS = {"accessibility_features", "special_hours", "images"}
+IMPORT_LIST_SEPARATOR = "|"
+IMPORT_JSON_FIELDS = {"sensory_info"}  # Exported as one JSON column (see csv_cell)
+
+
+async def iter_stream_lines(stream):
+    """Yield decoded lines from an async byte stream without buffering the whole body"""
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+class CsvLineFeed:
+    """Line iterator a csv.reader pulls from as lines arrive.
+
+    The reader is only advanced once the buffered lines close every quote, so
+    a quoted field spanning lines is read as one record.
+    """
+
+    def __init__(self):
+        self._lines: deque = deque()
+        self.in_quotes = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self._lines:
+            raise StopIteration
+        return self._lines.popleft()
+
+    def push(self, line: str):
+        self._lines.append(line + "\n")
+        if line.count('"') % 2:
+            self.in_quotes = not self.in_quotes
+
+
+async def iter_csv_records(lines):
+    """Yield (first line number, values) per CSV record, skipping blank lines.
+
+    A record that cannot be parsed is yielded as a ValueError in place of its values.
+    """
+    feed = CsvLineFeed()
+    reader = csv.reader(feed)
+    async for line in lines:
+        feed.push(line)
+        if feed.in_quotes:
+            continue
+        row_number = reader.line_num + 1
+        try:
+            values = next(reader)
+        except csv.Error as e:
+            yield row_number, ValueError(str(e))
+            continue
+        if any(value.strip() for value in values):
+            yield row_number, values
+    if feed.in_quotes:
+        yield reader.line_num + 1, ValueError("Unterminated quoted field")
+
+
+async def iter_ndjson_records(lines):
+    """Yield (line number, line) for each non-blank NDJSON line"""
+    row_number = 0
+    async for line in lines:
+        row_number += 1
+        if line.strip():
+            yield row_number, line
+
+
+def csv_row_to_establishment(header: List[str], values: List[str]) -> Dict[str, Any]:
+    """Expand a flat CSV row: dotted columns nest ("opening_hours.monday"), list columns split on "|",
+    JSON columns are decoded."""
+    row: Dict[str, Any] = {}
+    for column, value in zip(header, values):
+        if value == "":
+            continue
+        if column in ("lat", "lng"):
+            column = f"coordinates.{column}"
+        if "." in column:
+            parent, child = column.split(".", 1)
+            row.setdefault(parent, {})[child] = value
+        elif column in IMPORT_LIST_FIELDS:
+            row[column] = [item.strip() for item in value.split(IMPORT_LIST_SEPARATOR) if item.strip()]
+        elif column in IMPORT_JSON_FIELDS:
+            row[column] = json.loads(value)
+        else:
+            row[column] = value
+    return row
+
+
+def prepare_import_row(row: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Validate one import row into a full establishment document and the fields the row supplied"""
+    external_id = row.pop(IMPORT_KEY_FIELD, None)
+    establishment = EstablishmentCreate(**row)
+    supplied = set(establishment.model_fields_set)
+    est_dict = establishment.model_dump()
+    normalize_event_times(est_dict)
+    if "event_start" in supplied and est_dict["event_end"] is not None:
+        supplied.add("event_end")  # Defaulted to the start
+    full_doc = Establishment(**est_dict, external_id=external_id).model_dump()
+    full_doc["municipality"] = municipality_locator.locate(full_doc["coordinates"])
+    full_doc["hours_index"] = build_hours_index(full_doc)
+    full_doc["review_totals"] = empty_review_totals()
+    return full_doc, [field for field in est_dict if field in supplied]
+
+
+def build_import_operation(document: Dict[str, Any], imported_fields: List[str], now: datetime):
+    """An insert, or an upsert by external key, stamped with the batch write time"""
+    full_doc = dict(document, updated_at=now)
+    external_id = full_doc[IMPORT_KEY_FIELD]
+    if external_id is None:
+        return InsertOne(full_doc)
+
+    # Re-importing a venue refreshes only the columns its row supplied; ratings, reviews,
+    # certification and omitted columns keep their stored values
+    set_fields = {key: full_doc[key] for key in imported_fields}
+    for key in ("municipality", "updated_at"):
+        set_fields[key] = full_doc[key]
+    if {"opening_hours", "special_hours"} <= set(imported_fields):
+        set_fields["hours_index"] = full_doc["hours_index"]
+    on_insert = {key: value for key, value in full_doc.items() if key not in set_fields}
+    return UpdateOne(
+        {IMPORT_KEY_FIELD: external_id},
+        {"$set": set_fields, "$setOnInsert": on_insert},
+        upsert=True,
+    )
+
+
+class ImportReport:
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def add_error(self, row_number: int, error: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": error})
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+async def flush_import_batch(batch: List[Tuple[int, Dict[str, Any], List[str]]], report: ImportReport):
+    """Write a batch unordered, record per-row failures and refresh the in-memory indexes"""
+    if not batch:
+        return
+    # updated_at is the write time, not the parse time: delta sync expects it
+    # to be stamped within SYNC_SETTLE_SECONDS of the commit
+    now = datetime.utcnow()
+    failed_positions = set()
+    try:
+        result = await db.establishments.bulk_write(
+            [build_import_operation(document, fields, now) for _, document, fields in batch], ordered=False
+        )
+        details = result.bulk_api_result
+    except BulkWriteError as e:
+        details = e.details
+        for write_error in details.get("writeErrors", []):
+            failed_positions.add(write_error["index"])
+            report.add_error(batch[write_error["index"]][0], write_error.get("errmsg", "Write failed"))
+
+    report.inserted += details.get("nInserted", 0) + details.get("nUpserted", 0)
+    report.updated += details.get("nMatched", 0)
+
+    written = [document for position, (_, document, _) in enumerate(batch) if position not in failed_positions]
+    ids = [document["id"] for document in written if document[IMPORT_KEY_FIELD] is None]
+    external_ids = [document[IMPORT_KEY_FIELD] for document in written if document[IMPORT_KEY_FIELD] is not None]
+    inserted_ids = set(ids)
+    changes = []
+    stale_hours = []
+    cursor = db.establishments.find(
+        {"$or": [{"id": {"$in": ids}}, {IMPORT_KEY_FIELD: {"$in": external_ids}}]},
+        ESTABLISHMENT_INDEX_PROJECTION,
+    )
+    async for est in cursor:
+        # A row that supplied only some hour columns leaves hours_index to be rebuilt from the stored hours
+        hours_index = build_hours_index(est)
+        if est.get("hours_index") != hours_index:
+            est["hours_index"] = hours_index
+            stale_hours.append(UpdateOne({"id": est["id"]}, {"$set": {"hours_index": hours_index}}))
+        index_establishment(est)
+        operation = ChangeOperation.CREATE if est["id"] in inserted_ids else ChangeOperation.UPDATE
+        changes.append((est["id"], operation, est.get("updated_at")))
+    if stale_hours:
+        await db.establishments.bulk_write(stale_hours, ordered=False)
+    await record_changes("establishment", changes)
+
+
+# Streaming export
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_CHUNK_ROWS = 500
+
+# (column, kind) pairs; dotted columns read nested fields
+ESTABLISHMENT_EXPORT_COLUMNS = [
+    ("id", "str"), ("external_id", "str"), ("name", "str"), ("type", "str"),
+    ("description", "str"), ("address", "str"),
+    ("coordinates.lat", "float"), ("coordinates.lng", "float"), ("municipality", "str"),
+    ("accessibility_features", "list"),
+    ("certified_autism_friendly", "bool"), ("certification_date", "datetime"),
+    ("contact_info.phone", "str"), ("contact_info.email", "str"), ("contact_info.website", "str"),
+] + [(f"opening_hours.{day}", "str") for day in DAYS_OF_WEEK] + [
+    ("special_hours", "list"), ("sensory_info", "json"),
+    ("average_rating", "float"), ("autism_rating", "float"),
+    ("event_start", "datetime"), ("event_end", "datetime"),
+    ("images", "list"), ("created_at", "datetime"), ("updated_at", "datetime"),
+]
+
+REVIEW_EXPORT_COLUMNS = [
+    ("id", "str"), ("establishment_id", "str"), ("user_id", "str"), ("user_name", "str"),
+    ("rating", "int"), ("noise_level", "str"), ("lighting_level", "str"), ("visual_clarity", "str"),
+    ("staff_helpfulness", "int"), ("calm_areas_available", "bool"), ("comment", "str"),
+    ("status", "str"), ("created_at", "datetime"), ("approved_at", "datetime"), ("approved_by", "str"),
+]
+
+
+def json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def get_path(document: Dict[str, Any], path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def select_export_columns(columns: List[Tuple[str, str]], fields: Optional[str]) -> List[Tuple[str, str]]:
+    """Restrict export columns to the comma-separated top-level fields requested"""
+    if not fields:
+        return columns
+    wanted = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = wanted - {column.split(".")[0] for column, _ in columns}
+    if unknown or not wanted:
+        # An empty column list would project whole documents
+        raise HTTPException(status_code=400, detail=f"Unknown export fields: {', '.join(sorted(unknown)) or fields!r}")
+    return [(column, kind) for column, kind in columns if column.split(".")[0] in wanted]
+
+
+def export_projection(columns: List[Tuple[str, str]]) -> Dict[str, int]:
+    projection = {"_id": 0}
+    for column, _ in columns:
+        projection[column.split(".")[0]] = 1
+    return projection
+
+
+async def ndjson_chunks(cursor):
+    lines = []
+    async for document in cursor:
+        lines.append(json.dumps(document, default=json_default, ensure_ascii=False))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def csv_cell(value: Any, kind: str) -> Any:
+    if value is None:
+        return ""
+    if kind == "list":
+        return IMPORT_LIST_SEPARATOR.join(str(item) for item in value)
+    if kind == "json":
+        return json.dumps(value, default=json_default, ensure_ascii=False)
+    if kind == "datetime":
+        return value.isoformat()
+    return value
+
+
+async def csv_chunks(cursor, columns: List[Tuple[str, str]]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column for column, _ in columns])
+    rows = 0
+    async for document in cursor:
+        writer.writerow([csv_cell(get_path(document, column), kind) for column, kind in columns])
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+class DrainableSink(io.RawIOBase):
+    """Write-only file object whose written bytes are collected and drained between row groups"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+async def parquet_chunks(cursor, columns: List[Tuple[str, str]]):
+    """Write one Parquet row group per chunk of documents and stream the bytes as they are produced"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {
+        "str": pa.string(), "json": pa.string(), "float": pa.float64(), "int": pa.int64(),
+        "bool": pa.bool_(), "datetime": pa.timestamp("ms"), "list": pa.list_(pa.string()),
+    }
+    schema = pa.schema([(column, arrow_types[kind]) for column, kind in columns])
+
+    def to_table(documents: List[Dict[str, Any]]):
+        data = {}
+        for column, kind in columns:
+            values = [get_path(document, column) for document in documents]
+            if kind == "json":
+                values = [None if value is None else json.dumps(value, default=json_default) for value in values]
+            elif kind == "str":
+                values = [None if value is None else str(value) for value in values]
+            data[column] = values
+        return pa.Table.from_pydict(data, schema=schema)
+
+    sink = DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    documents = []
+    async for document in cursor:
+        documents.append(document)
+        if len(documents) >= EXPORT_CHUNK_ROWS:
+            writer.write_table(to_table(documents))
+            documents = []
+            yield sink.drain()
+    if documents:
+        writer.write_table(to_table(documents))
+    writer.close()
+    yield sink.drain()
+
+
+def export_response(cursor, format: str, columns: List[Tuple[str, str]], name: str) -> StreamingResponse:
+    if format == "csv":
+        body = csv_chunks(cursor, columns)
+    elif format == "parquet":
+        body = parquet_chunks(cursor, columns)
+    else:
+        body = ndjson_chunks(cursor)
+    extension = "parquet" if format == "parquet" else format
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'},
+    )
+
+
+# Review rating aggregates
+# Establishments keep running totals of their counted reviews (legacy embedded
+# reviews plus approved moderated reviews), so ratings move by deltas instead
+# of being recomputed from every review.
+SENSORY_LEVEL_SCORES = {level: position + 1 for position, level in enumerate(SENSORY_LEVEL_ORDER)}
+# Recent bulk moderation ids kept on each review; see moderate_reviews()
+MODERATION_ID_HISTORY = 10
+
+# Reviews as returned by the API; moderation_ids is internal bookkeeping
+REVIEW_PROJECTION = {"_id": 0, "moderation_ids": 0}
+REVIEW_SCORE_PROJECTION = {
+    "_id": 0, "id": 1, "establishment_id": 1, "status": 1,
+    "rating": 1, "staff_helpfulness": 1, "noise_level": 1, "calm_areas_available": 1,
+}
+ESTABLISHMENT_INDEX_PROJECTION = {"_id": 0, "reviews": 0, "images": 0, "description": 0}
+
+
+def empty_review_totals() -> Dict[str, float]:
+    return {"count": 0, "rating_sum": 0.0, "autism_sum": 0.0}
+
+
+def review_autism_score(review: Dict[str, Any]) -> float:
+    """Autism-friendliness of one review: staff help, quietness and calm areas on a 1-5 scale"""
+    return (
+        review["staff_helpfulness"]
+        + (6 - SENSORY_LEVEL_SCORES.get(review["noise_level"], 3))
+        + (5 if review["calm_areas_available"] else 1)
+    ) / 3
+
+
+def add_review_delta(deltas: Dict[str, Dict[str, float]], review: Dict[str, Any], sign: int):
+    delta = deltas.setdefault(review["establishment_id"], empty_review_totals())
+    delta["count"] += sign
+    delta["rating_sum"] += sign * review["rating"]
+    delta["autism_sum"] += sign * review_autism_score(review)
+
+
+def moderation_deltas(previous_reviews: List[Dict[str, Any]], new_status: ReviewStatus) -> Dict[str, Dict[str, float]]:
+    """Per-establishment aggregate changes caused by moving reviews to new_status"""
+    deltas: Dict[str, Dict[str, float]] = {}
+    is_approved = new_status == ReviewStatus.APPROVED
+    for review in previous_reviews:
+        was_approved = review.get("status") == ReviewStatus.APPROVED
+        if was_approved != is_approved:
+            add_review_delta(deltas, review, 1 if is_approved else -1)
+    return deltas
+
+
+def review_totals_pipeline(totals: Dict[str, float], now: datetime) -> List[Dict[str, Any]]:
+    """Update pipeline storing review_totals and deriving the averages from them"""
+    def average(field: str):
+        return {"$cond": [
+            {"$gt": ["$review_totals.count", 0]},
+            {"$round": [{"$divide": [f"$review_totals.{field}", "$review_totals.count"]}, 2]},
+            0.0,
+        ]}
+
+    return [
+        {"$set": {"review_totals": {"$literal": totals}}},
+        {"$set": {
+            "average_rating": average("rating_sum"),
+            "autism_rating": average("autism_sum"),
+            "updated_at": now,
+        }},
+    ]
+
+
+async def compute_review_totals(
+    establishment_ids: Optional[List[str]] = None
+) -> Tuple[Dict[str, Dict[str, float]], Dict[str, Optional[Dict[str, float]]]]:
+    """Review totals recomputed from the counted reviews, and the stored ones, by establishment.
+
+    Covers the given establishments, or the whole catalogue when establishment_ids is None.
+    """
+    establishment_query = {} if establishment_ids is None else {"id": {"$in": establishment_ids}}
+    totals: Dict[str, Dict[str, float]] = {}
+    stored: Dict[str, Optional[Dict[str, float]]] = {}
+    cursor = db.establishments.find(establishment_query, {"_id": 0, "id": 1, "reviews": 1, "review_totals": 1})
+    async for est in cursor:
+        totals[est["id"]] = empty_review_totals()
+        stored[est["id"]] = est.get("review_totals")
+        for review in est.get("reviews", []):
+            add_review_delta(totals, dict(review, establishment_id=est["id"]), 1)
+
+    review_query: Dict[str, Any] = {"status": ReviewStatus.APPROVED.value}
+    if establishment_ids is not None:
+        review_query["establishment_id"] = {"$in": establishment_ids}
+    async for review in db.reviews.find(review_query, REVIEW_SCORE_PROJECTION):
+        if review["establishment_id"] in totals:
+            add_review_delta(totals, review, 1)
+    return totals, stored
+
+
+def review_totals_match(stored: Optional[Dict[str, float]], total: Dict[str, float]) -> bool:
+    return stored is not None and all(
+        math.isclose(stored.get(field, 0), total[field], abs_tol=1e-6) for field in ("count", "rating_sum", "autism_sum")
+    )
+
+
+async def recompute_review_totals(establishment_ids: List[str]):
+    """Store review totals recomputed from the reviews, then refresh indexes and the rollup.
+
+    Safe to retry or rerun: the result depends only on the reviews, not on earlier runs.
+    """
+    totals, _ = await compute_review_totals(establishment_ids)
+    if not totals:
+        return
+    now = datetime.utcnow()
+    await db.establishments.bulk_write(
+        [UpdateOne({"id": est_id}, review_totals_pipeline(total, now)) for est_id, total in totals.items()],
+        ordered=False,
+    )
+    changes = []
+    cursor = db.establishments.find({"id": {"$in": list(totals)}}, ESTABLISHMENT_INDEX_PROJECTION)
+    async for est in cursor:
+        index_establishment(est)
+        municipality_rollup.set(est, int(totals[est["id"]]["count"]))
+        changes.append((est["id"], ChangeOperation.UPDATE, est.get("updated_at")))
+    await record_changes("establishment", changes)
+
+
+async def reconcile_review_totals():
+    """Rewrite review totals that are missing or no longer match the reviews.
+
+    Runs at startup, so recomputations queued in memory and lost to a restart
+    are caught up.
+    """
+    totals, stored = await compute_review_totals()
+    now = datetime.utcnow()
+    stale = [est_id for est_id, total in totals.items() if not review_totals_match(stored[est_id], total)]
+    if not stale:
+        return
+    logger.info("Reconciling review totals of %d establishments", len(stale))
+    for start in range(0, len(stale), IMPORT_BATCH_SIZE):
+        await db.establishments.bulk_write([
+            UpdateOne({"id": est_id}, review_totals_pipeline(totals[est_id], now))
+            for est_id in stale[start:start + IMPORT_BATCH_SIZE]
+        ], ordered=False)
+    await record_changes("establishment", [(est_id, ChangeOperation.UPDATE, now) for est_id in stale])
+
+
+# Review moderation queue
+REVIEW_COUNTERS_ID = "review_status_counts"
+REVIEW_QUEUE_MAX_LIMIT = 200
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Opaque pagination token for the sort key of the last returned item"""
+    payload = json.dumps(values, default=json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token: str, fields: Dict[str, type], detail: str = "Invalid cursor") -> Dict[str, Any]:
+    """Decode a pagination token into the expected fields, converting datetimes; 400 on any other shape"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        if not isinstance(values, dict):
+            raise ValueError(detail)
+        position = {}
+        for field, kind in fields.items():
+            value = values.get(field)
+            position[field] = datetime.fromisoformat(value) if kind is datetime else value
+            if not isinstance(position[field], kind):
+                raise ValueError(detail)
+        return position
+    except (TypeError, ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail=detail)
+
+
+async def adjust_review_counts(changes: Dict[str, int]):
+    """Apply status count changes to the maintained review counters"""
+    changes = {status: delta for status, delta in changes.items() if delta}
+    if not changes:
+        return
+    await db.counters.update_one(
+        {"_id": REVIEW_COUNTERS_ID},
+        {"$inc": {f"counts.{getattr(status, 'value', status)}": delta for status, delta in changes.items()}},
+        upsert=True,
+    )
+
+
+async def get_review_counts() -> Dict[str, int]:
+    counters = await db.counters.find_one({"_id": REVIEW_COUNTERS_ID}) or {}
+    counts = counters.get("counts", {})
+    return {status.value: counts.get(status.value, 0) for status in ReviewStatus}
+
+
+async def initialize_review_counts():
+    """Seed the review counters once from the collection"""
+    if await db.counters.find_one({"_id": REVIEW_COUNTERS_ID}):
+        return
+    counts = {status.value: 0 for status in ReviewStatus}
+    async for row in db.reviews.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+    await db.counters.update_one(
+        {"_id": REVIEW_COUNTERS_ID}, {"$setOnInsert": {"counts": counts}}, upsert=True
+    )
+
+
+class ReviewQueuePage(BaseModel):
+    items: List[Review]
+    next_cursor: Optional[str] = None
+    counts: Dict[str, int]
+
+
+# User search
+USER_SEARCH_MAX_LIMIT = 100
+USER_SORTS = {
+    "name": [("name_key", 1), ("id", 1)],
+    "created_at": [("created_at", -1), ("id", -1)],
+}
+
+
+def search_key(text: str) -> str:
+    """Case- and accent-insensitive form used for user lookup and prefix search"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).strip().lower()
+
+
+def user_search_fields(user: Dict[str, Any]) -> Dict[str, str]:
+    fields = {}
+    if "name" in user:
+        fields["name_key"] = search_key(user["name"])
+    if "email" in user:
+        fields["email_key"] = search_key(user["email"])
+    return fields
+
+
+async def prepare_user_indexes():
+    """Backfill search keys and create the user lookup indexes"""
+    operations = [
+        UpdateOne({"id": user["id"]}, {"$set": user_search_fields(user)})
+        async for user in db.users.find(
+            {"email_key": {"$exists": False}}, {"_id": 0, "id": 1, "name": 1, "email": 1}
+        )
+    ]
+    if operations:
+        await db.users.bulk_write(operations, ordered=False)
+
+    await db.users.create_index([("name_key", 1), ("id", 1)])
+    await db.users.create_index([("created_at", -1), ("id", -1)])
+    try:
+        await db.users.create_index("email_key", unique=True)
+    except OperationFailure as e:
+        # Existing duplicate emails must be merged before uniqueness can be enforced
+        logger.warning("Could not create unique email index: %s", e)
+        await db.users.create_index("email_key")
+
+
+class UserSearchPage(BaseModel):
+    items: List[UserProfile]
+    next_cursor: Optional[str] = None
+    estimated_total: int
+
+
+# Admin dashboard summary
+ADMIN_SUMMARY_TTL_SECONDS = 5
+ADMIN_SUMMARY_RECENT_ITEMS = 5
+
+
+class TimedCache:
+    """In-process LRU cache of computed values with a time-to-live.
+
+    Concurrent misses for the same key share a single computation. At most
+    max_entries values are kept; expired values are dropped when looked up
+    or when they reach the least recently used end.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._values: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        cached = self._values.get(key)
+        if cached is None:
+            return False, None
+        if cached[0] <= time.monotonic():
+            del self._values[key]
+            return False, None
+        self._values.move_to_end(key)
+        return True, cached[1]
+
+    def _store(self, key: str, value: Any):
+        now = time.monotonic()
+        self._values[key] = (now + self.ttl_seconds, value)
+        self._values.move_to_end(key)
+        while self._values:
+            oldest_key, (expires_at, _) = next(iter(self._values.items()))
+            if len(self._values) <= self.max_entries and expires_at > now:
+                break
+            del self._values[oldest_key]
+
+    async def get_or_compute(self, key: str, compute):
+        found, value = self._get(key)
+        if found:
+            return value
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                found, value = self._get(key)
+                if found:
+                    return value
+                value = await compute()
+                self._store(key, value)
+                return value
+        finally:
+            # Waiters keep their reference; later callers hit the stored value
+            if self._locks.get(key) is lock:
+                del self._locks[key]
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+
+    def invalidate_prefix(self, prefix: str):
+        for key in [key for key in self._values if key.startswith(prefix)]:
+            del self._values[key]
+
+
+admin_summary_cache = TimedCache(ADMIN_SUMMARY_TTL_SECONDS)
+
+
+async def compute_admin_summary() -> Dict[str, Any]:
+    recent = ADMIN_SUMMARY_RECENT_ITEMS
+    card_projection = {"_id": 0, "id": 1, "name": 1, "type": 1, "municipality": 1,
+                       "certified_autism_friendly": 1, "autism_rating": 1, "created_at": 1}
+    review_projection = {"_id": 0, "id": 1, "establishment_id": 1, "user_name": 1, "rating": 1,
+                         "comment": 1, "status": 1, "created_at": 1}
+    (
+        establishment_groups,
+        review_counts,
+        user_count,
+        active_partner_count,
+        recent_establishments,
+        recent_reviews,
+        recent_users,
+        oldest_pending_reviews,
+        uncertified_top_rated,
+    ) = await asyncio.gather(
+        db.establishments.aggregate([
+            {"$group": {
+                "_id": {"type": "$type", "certified": "$certified_autism_friendly"},
+                "count": {"$sum": 1},
+            }}
+        ]).to_list(None),
+        get_review_counts(),
+        db.users.estimated_document_count(),
+        db.partners.count_documents({"is_active": True}),
+        db.establishments.find({}, card_projection).sort("created_at", -1).to_list(recent),
+        db.reviews.find({}, review_projection).sort("created_at", -1).to_list(recent),
+        db.users.find({}, {"_id": 0, "id": 1, "name": 1, "email": 1, "created_at": 1})
+            .sort("created_at", -1).to_list(recent),
+        db.reviews.find({"status": ReviewStatus.PENDING.value}, review_projection)
+            .sort("created_at", 1).to_list(recent),
+        db.establishments.find({"certified_autism_friendly": {"$ne": True}}, card_projection)
+            .sort("autism_rating", -1).to_list(recent),
+    )
+
+    by_type = {establishment_type.value: 0 for establishment_type in EstablishmentType}
+    certified = 0
+    for group in establishment_groups:
+        by_type[group["_id"]["type"]] = by_type.get(group["_id"]["type"], 0) + group["count"]
+        if group["_id"].get("certified"):
+            certified += group["count"]
+    total = sum(by_type.values())
+
+    return {
+        "establishments": {
+            "total": total,
+            "by_type": by_type,
+            "certified": certified,
+            "not_certified": total - certified,
+        },
+        "reviews": review_counts,
+        "users": user_count,
+        "active_partners": active_partner_count,
+        "recent": {
+            "establishments": recent_establishments,
+            "reviews": recent_reviews,
+            "users": recent_users,
+        },
+        "pending": {
+            "oldest_reviews": oldest_pending_reviews,
+            "certification_candidates": uncertified_top_rated,
+        },
+        "generated_at": datetime.utcnow(),
+    }
+
+
+# Establishment detail
+DETAIL_CARD_PROJECTION = {"_id": 0, "id": 1, "name": 1, "type": 1, "address": 1, "coordinates": 1,
+                          "municipality": 1, "certified_autism_friendly": 1, "autism_rating": 1,
+                          "average_rating": 1, "accessibility_features": 1}
+
+
+async def approved_reviews_page(establishment_id: str, cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"establishment_id": establishment_id, "status": ReviewStatus.APPROVED.value}
+    if cursor:
+        position = decode_cursor(cursor, {"created_at": datetime, "id": str})
+        last_created_at = position["created_at"]
+        query["$or"] = [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": last_created_at, "id": {"$lt": position["id"]}},
+        ]
+    reviews = await db.reviews.find(query, REVIEW_PROJECTION).sort([("created_at", -1), ("id", -1)]).to_list(limit + 1)
+    next_cursor = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        next_cursor = encode_cursor({"created_at": reviews[-1]["created_at"], "id": reviews[-1]["id"]})
+    return {"items": reviews, "next_cursor": next_cursor}
+
+
+REVIEW_SUMMARY_GROUP = {
+    "count": {"$sum": 1},
+    "average_rating": {"$avg": "$rating"},
+    "average_staff_helpfulness": {"$avg": "$staff_helpfulness"},
+    "calm_areas_reported": {"$sum": {"$cond": ["$calm_areas_available", 1, 0]}},
+    "noise_levels": {"$push": "$noise_level"},
+}
+
+
+def review_summary_from_row(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not row or not row["count"]:
+        return {"count": 0, "average_rating": 0.0, "average_staff_helpfulness": 0.0,
+                "calm_areas_share": 0.0, "noise_levels": {}}
+    noise_levels: Dict[str, int] = {}
+    for level in row["noise_levels"]:
+        noise_levels[level] = noise_levels.get(level, 0) + 1
+    return {
+        "count": row["count"],
+        "average_rating": round(row["average_rating"], 2),
+        "average_staff_helpfulness": round(row["average_staff_helpfulness"], 2),
+        "calm_areas_share": round(row["calm_areas_reported"] / row["count"], 2),
+        "noise_levels": noise_levels,
+    }
+
+
+async def approved_review_summary(establishment_id: str) -> Dict[str, Any]:
+    rows = await db.reviews.aggregate([
+        {"$match": {"establishment_id": establishment_id, "status": ReviewStatus.APPROVED.value}},
+        {"$group": {"_id": None, **REVIEW_SUMMARY_GROUP}},
+    ]).to_list(1)
+    return review_summary_from_row(rows[0] if rows else None)
+
+
+async def approved_review_summaries() -> Dict[str, Dict[str, Any]]:
+    """Review summaries of every establishment with approved reviews, by establishment id"""
+    rows = await db.reviews.aggregate([
+        {"$match": {"status": ReviewStatus.APPROVED.value}},
+        {"$group": {"_id": "$establishment_id", **REVIEW_SUMMARY_GROUP}},
+    ]).to_list(None)
+    return {row["_id"]: review_summary_from_row(row) for row in rows}
+
+
+async def nearby_establishments(establishment_id: str, limit: int, max_km: float) -> List[Dict[str, Any]]:
+    """Closest venues from the coordinate index, as lightweight cards"""
+    nearest = coordinate_index.nearest(establishment_id, limit, max_km)
+    if not nearest:
+        return []
+    distances = dict(nearest)
+    cards = await db.establishments.find({"id": {"$in": list(distances)}}, DETAIL_CARD_PROJECTION).to_list(limit)
+    for card in cards:
+        card["distance_km"] = round(float(distances[card["id"]]), 2)
+    cards.sort(key=lambda card: card["distance_km"])
+    return cards
+
+
+# Batch requests
+BATCH_MAX_REQUESTS = 20
+
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str  # e.g. "/api/establishments?limit=3"
+    body: Optional[Any] = None
+    headers: Dict[str, str] = {}
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(max_length=BATCH_MAX_REQUESTS)
+
+
+async def dispatch_subrequest(sub_request: BatchSubRequest) -> Dict[str, Any]:
+    """Run one sub-request through the application in-process and capture its response"""
+    path, _, query_string = sub_request.path.partition("?")
+    if not path.startswith(api_router.prefix + "/") or path.rstrip("/") == f"{api_router.prefix}/batch":
+        return {"id": sub_request.id, "status": 400, "body": {"detail": "Unsupported batch path"}}
+
+    body = b"" if sub_request.body is None else json.dumps(sub_request.body, default=json_default).encode("utf-8")
+    headers = {key.lower(): value for key, value in sub_request.headers.items()}
+    # The batch envelope is encoded once at the end, so sub-responses stay uncompressed JSON
+    headers["accept-encoding"] = "identity"
+    headers["accept"] = "application/json"
+    if body:
+        headers.setdefault("content-type", "application/json")
+        headers["content-length"] = str(len(body))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": sub_request.method.upper(),
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": query_string.encode("utf-8"),
+        "root_path": "",
+        "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()],
+        "client": ("batch", 0),
+        "server": ("batch", 80),
+    }
+
+    request_sent = False
+    response_complete = asyncio.Event()
+    response: Dict[str, Any] = {"status": 500, "headers": [], "body": []}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await response_complete.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_complete.set()
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # The error middleware has already sent a 500 response; keep the rest of the batch going
+        logger.exception("Batch sub-request %s %s failed", scope["method"], sub_request.path)
+    finally:
+        response_complete.set()
+
+    raw_body = b"".join(response["body"])
+    content_type = next(
+        (value.decode("latin-1") for key, value in response["headers"] if key.lower() == b"content-type"), ""
+    )
+    parsed_body = raw_body.decode("utf-8", errors="replace")
+    if content_type.split(";")[0].strip().lower() == "application/json" and raw_body:
+        try:
+            parsed_body = json.loads(raw_body)
+        except ValueError:
+            pass
+    return {"id": sub_request.id, "status": response["status"], "body": parsed_body}
+
+
+# Establishment patches
+# JSON Patch (RFC 6902) and JSON Merge Patch (RFC 7396) documents are compiled
+# into a single update pipeline whose $set/$project stages apply the operations
+# in order, so readers never see a partly applied patch.
+JSON_PATCH_MEDIA_TYPE = "application/json-patch+json"
+MERGE_PATCH_MEDIA_TYPE = "application/merge-patch+json"
+PATCH_ARRAY_SLICE_MAX = 2 ** 31 - 1  # "to the end" count for $slice
+
+
+def parse_json_pointer(pointer: str) -> List[str]:
+    if not pointer.startswith("/"):
+        raise HTTPException(status_code=400, detail=f"Invalid JSON pointer: {pointer!r}")
+    segments = [segment.replace("~1", "/").replace("~0", "~") for segment in pointer[1:].split("/")]
+    for segment in segments:
+        if not segment or "." in segment or segment.startswith("$"):
+            raise HTTPException(status_code=400, detail=f"Unsupported path segment: {segment!r}")
+    return segments
+
+
+def unwrap_optional(annotation):
+    if get_origin(annotation) is Union:
+        arguments = [argument for argument in get_args(annotation) if argument is not type(None)]
+        if len(arguments) == 1:
+            return arguments[0]
+    return annotation
+
+
+def patch_path_type(segments: List[str]):
+    """Declared Establishment type at a patch path (Any below free-form fields)"""
+    field = segments[0]
+    if field not in EstablishmentUpdate.model_fields:
+        raise HTTPException(status_code=400, detail=f"Field cannot be patched: {field}")
+    annotation = Establishment.model_fields[field].annotation
+    for segment in segments[1:]:
+        annotation = unwrap_optional(annotation)
+        if annotation is Any:
+            return Any
+        origin = get_origin(annotation)
+        if origin is dict:
+            annotation = get_args(annotation)[1]
+        elif origin is list:
+            if segment != "-" and not segment.isdigit():
+                raise HTTPException(status_code=400, detail=f"Invalid array index: {segment!r}")
+            annotation = get_args(annotation)[0]
+        else:
+            raise HTTPException(status_code=400, detail=f"Path not found: /{'/'.join(segments)}")
+    return annotation
+
+
+def patch_path_expression(segments: List[str]) -> Any:
+    """Aggregation expression reading the value at a patch path; array indexes use $arrayElemAt"""
+    if not any(segment.isdigit() for segment in segments[1:]):
+        return "$" + ".".join(segments)
+    expression: Any = "$" + segments[0]
+    for segment in segments[1:]:
+        if segment.isdigit():
+            expression = {"$arrayElemAt": [expression, int(segment)]}
+        else:
+            expression = {"$getField": {"field": {"$literal": segment}, "input": expression}}
+    return expression
+
+
+def validate_patch_value(segments: List[str], value: Any) -> Any:
+    annotation = patch_path_type(segments)
+    if annotation is Any:
+        return value
+    try:
+        validated = TypeAdapter(annotation).validate_python(value)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid value for /{'/'.join(segments)}: {e}")
+    if segments[0] in ("event_start", "event_end") and isinstance(validated, datetime):
+        validated = to_naive_utc(validated)
+    return validated
+
+
+def is_array_path(segments: List[str]) -> bool:
+    return get_origin(unwrap_optional(patch_path_type(segments))) is list
+
+
+def paths_overlap(first: str, second: str) -> bool:
+    return first == second or first.startswith(second + ".") or second.startswith(first + ".")
+
+
+def array_slice(array_path: str, start: int, end: Optional[int] = None) -> Dict[str, Any]:
+    """Pipeline expression for items start..end (to the end if None) of a possibly missing array"""
+    array = {"$ifNull": [f"${array_path}", []]}
+    if end is not None:
+        return {"$slice": [array, start, max(end - start, 1)]} if end > start else {"$literal": []}
+    return {"$slice": [array, start, PATCH_ARRAY_SLICE_MAX]}
+
+
+class PatchCompiler:
+    """Compiles patch operations into one update pipeline, applied atomically and in order.
+
+    Array items are replaced, inserted and removed by index with $slice and
+    $concatArrays. Indexes that must exist become conditions on the stored
+    array's length, offset by the earlier operations on the same array.
+    """
+
+    def __init__(self):
+        self.stages: List[Dict[str, Any]] = []
+        self.conditions: List[Dict[str, Any]] = []
+        self.touched_fields: Set[str] = set()
+        self._stage_paths: List[str] = []
+        # Array path -> (exact length if set by this patch, else change from the stored length)
+        self._array_lengths: Dict[str, Tuple[bool, int]] = {}
+        self._required_lengths: Dict[str, int] = {}
+
+    def _add(self, operator: str, path: str, value: Any):
+        stage = self.stages[-1] if self.stages else None
+        if stage is None or operator not in stage or any(paths_overlap(path, other) for other in self._stage_paths):
+            stage = {operator: {}}
+            self.stages.append(stage)
+            self._stage_paths = []
+        stage[operator][path] = value
+        self._stage_paths.append(path)
+        self.touched_fields.add(path.split(".")[0])
+        for array_path in [array_path for array_path in self._array_lengths if paths_overlap(path, array_path)]:
+            del self._array_lengths[array_path]
+
+    def _index(self, segments: List[str], required_length: int) -> int:
+        """Validate an array index against the length it needs, given earlier operations"""
+        array_path = ".".join(segments[:-1])
+        index = int(segments[-1]) + required_length
+        known, length = self._array_lengths.get(array_path, (False, 0))
+        if known:
+            if length < index:
+                raise HTTPException(status_code=400, detail=f"Array index out of range: /{'/'.join(segments)}")
+        elif index - length > 0:
+            self._required_lengths[array_path] = max(self._required_lengths.get(array_path, 0), index - length)
+        return int(segments[-1])
+
+    def _resize(self, array_path: str, change: int):
+        known, length = self._array_lengths.get(array_path, (False, 0))
+        self._array_lengths[array_path] = (known, length + change)
+
+    def filter(self, establishment_id: str) -> Dict[str, Any]:
+        """Update filter: the id, test conditions and the array lengths the patch relies on"""
+        query: Dict[str, Any] = {"id": establishment_id}
+        if self.conditions:
+            query["$expr"] = self.conditions[0] if len(self.conditions) == 1 else {"$and": self.conditions}
+        if self._required_lengths:
+            query["$and"] = [
+                {f"{array_path}.{length - 1}": {"$exists": True}}
+                for array_path, length in self._required_lengths.items()
+            ]
+        return query
+
+    def set(self, segments: List[str], value: Any):
+        value = validate_patch_value(segments, value)
+        if len(segments) > 1 and is_array_path(segments[:-1]):
+            if segments[-1] == "-":
+                raise HTTPException(status_code=400, detail="Cannot replace past the end of an array")
+            array_path = ".".join(segments[:-1])
+            index = self._index(segments, 1)
+            self._add("$set", array_path, {"$concatArrays": [
+                array_slice(array_path, 0, index), {"$literal": [value]}, array_slice(array_path, index + 1),
+            ]})
+            self._resize(array_path, 0)
+            return
+        path = ".".join(segments)
+        self._add("$set", path, {"$literal": value})
+        if isinstance(value, list):
+            self._array_lengths[path] = (True, len(value))
+
+    def add(self, segments: List[str], value: Any):
+        if len(segments) > 1 and is_array_path(segments[:-1]):
+            item = validate_patch_value(segments, value)
+            array_path = ".".join(segments[:-1])
+            if segments[-1] == "-":
+                head, tail = {"$ifNull": [f"${array_path}", []]}, {"$literal": []}
+            else:
+                index = self._index(segments, 0)
+                head, tail = array_slice(array_path, 0, index), array_slice(array_path, index)
+            self._add("$set", array_path, {"$concatArrays": [head, {"$literal": [item]}, tail]})
+            self._resize(array_path, 1)
+        else:
+            self.set(segments, value)
+
+    def remove(self, segments: List[str]):
+        if len(segments) == 1:
+            raise HTTPException(status_code=400, detail=f"Field cannot be removed: {segments[0]}")
+        if is_array_path(segments[:-1]):
+            if segments[-1] == "-":
+                raise HTTPException(status_code=400, detail="Cannot remove past the end of an array")
+            array_path = ".".join(segments[:-1])
+            index = self._index(segments, 1)
+            self._add("$set", array_path, {"$concatArrays": [
+                array_slice(array_path, 0, index), array_slice(array_path, index + 1),
+            ]})
+            self._resize(array_path, -1)
+        else:
+            patch_path_type(segments)
+            # An exclusion $project is the $unset stage
+            self._add("$project", ".".join(segments), 0)
+
+    def test(self, segments: List[str], value: Any):
+        if self.stages:
+            raise HTTPException(status_code=400, detail="test operations must come before changes")
+        patch_path_type(segments)
+        if "-" in segments:
+            raise HTTPException(status_code=400, detail=f"Path not found: /{'/'.join(segments)}")
+        # Exact equality: a query filter would also match one element of an array or a null against a missing field
+        self.conditions.append({"$eq": [patch_path_expression(segments), {"$literal": value}]})
+
+
+def compile_json_patch(operations: List[Dict[str, Any]]) -> PatchCompiler:
+    compiler = PatchCompiler()
+    for operation in operations:
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise HTTPException(status_code=400, detail="Each operation needs op and path")
+        segments = parse_json_pointer(operation["path"])
+        op = operation["op"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise HTTPException(status_code=400, detail=f"{op} operation needs a value")
+        if op == "add":
+            compiler.add(segments, operation["value"])
+        elif op == "replace":
+            compiler.set(segments, operation["value"])
+        elif op == "remove":
+            compiler.remove(segments)
+        elif op == "test":
+            compiler.test(segments, operation["value"])
+        else:
+            raise HTTPException(status_code=422, detail=f"Unsupported patch operation: {op}")
+    return compiler
+
+
+def compile_merge_patch(patch: Dict[str, Any]) -> PatchCompiler:
+    compiler = PatchCompiler()
+
+    def walk(prefix: List[str], members: Dict[str, Any]):
+        for key, value in members.items():
+            segments = prefix + [key]
+            if "." in key or key.startswith("$") or not key:
+                raise HTTPException(status_code=400, detail=f"Unsupported member name: {key!r}")
+            if value is None and len(segments) > 1:
+                compiler.remove(segments)
+            elif isinstance(value, dict) and (
+                patch_path_type(segments) is Any or get_origin(unwrap_optional(patch_path_type(segments))) is dict
+            ):
+                walk(segments, value)
+            else:
+                compiler.set(segments, value)
+
+    walk([], patch)
+    return compiler
+
+
+def index_establishment(establishment: Dict[str, Any]):
+    """Refresh every in-memory index derived from an establishment document"""
+    index_establishment_hours(establishment["id"], establishment.get("hours_index", {}))
+    index_event(establishment)
+    coordinate_index.set(establishment["id"], establishment.get("coordinates", {}))
+    municipality_rollup.set(establishment)
+    leaderboards.set(establishment)
+    establishment_detail_cache.invalidate_prefix(f"{establishment['id']}:")
+    catalogue_snapshots.mark_dirty()
+
+
+def unindex_establishment(establishment_id: str):
+    unindex_establishment_hours(establishment_id)
+    upcoming_events_index.remove(establishment_id)
+    coordinate_index.remove(establishment_id)
+    municipality_rollup.remove(establishment_id)
+    leaderboards.remove(establishment_id)
+    establishment_detail_cache.invalidate_prefix(f"{establishment_id}:")
+    catalogue_snapshots.mark_dirty()
+
+
+# Response formats
+# API routes answer in MessagePack instead of JSON when the Accept header
+# prefers application/msgpack. The negotiated format is kept in a context
+# variable for the duration of the handler, so the renderers below produce
+# either encoding from the same response models.
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+response_format: ContextVar[str] = ContextVar("response_format", default="json")
+
+
+def parse_quality_values(header: str) -> Dict[str, float]:
+    """Map each token of an Accept-style header to its q-value"""
+    weights: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, parameters = part.strip().partition(";")
+        weight = 1.0
+        parameter = parameters.strip()
+        if parameter.startswith("q="):
+            try:
+                weight = float(parameter[2:])
+            except ValueError:
+                weight = 0.0
+        if name:
+            weights[name.strip().lower()] = weight
+    return weights
+
+
+def negotiate_format(accept: str) -> str:
+    if msgpack is None:
+        return "json"
+    weights = parse_quality_values(accept)
+    msgpack_weight = max(weights.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    json_weight = max(weights.get("application/json", 0.0), weights.get("application/*", 0.0), weights.get("*/*", 0.0))
+    return "msgpack" if msgpack_weight > 0 and msgpack_weight >= json_weight else "json"
+
+
+def pack_msgpack(content: Any) -> bytes:
+    """MessagePack with datetimes as ISO strings, matching the JSON output"""
+    return msgpack.packb(content, default=json_default)
+
+
+class NegotiatedResponse(ORJSONResponse):
+    """JSON response that renders MessagePack when the route negotiated it"""
+
+    def __init__(self, content: Any = None, status_code: int = 200, headers=None, media_type=None, background=None):
+        if media_type is None and response_format.get() == "msgpack":
+            media_type = MSGPACK_MEDIA_TYPES[0]
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type == MSGPACK_MEDIA_TYPES[0]:
+            return pack_msgpack(content)
+        return super().render(content)
+
+
+class NegotiatedRoute(APIRoute):
+    """Route that negotiates the response format from the Accept header"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request) -> Response:
+            token = response_format.set(negotiate_format(request.headers.get("accept", "")))
+            origin = command_origin.set(f"{request.method} {self.path_format}")
+            try:
+                response = await handler(request)
+            finally:
+                command_origin.reset(origin)
+                response_format.reset(token)
+            if msgpack is not None:
+                response.headers.add_vary_header("Accept")
+            return response
+
+        return negotiated_handler
+
+
+# Routes declared below are created with format negotiation
+api_router.route_class = NegotiatedRoute
+
+
+# Response rendering
+# List routes validate a whole result set in one TypeAdapter call and return the
+# rendered bytes, so FastAPI does not validate and encode every item again. With
+# TRUSTED_DB_DOCUMENTS set, documents read from our own collections skip
+# validation and are trimmed to the model's fields and rendered by orjson.
+TRUSTED_DB_DOCUMENTS = os.environ.get('TRUSTED_DB_DOCUMENTS', '').lower() in ('1', 'true', 'yes')
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def model_adapter(model: type) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+@functools.lru_cache(maxsize=None)
+def model_list_adapter(model: type) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+@functools.lru_cache(maxsize=None)
+def model_field_defaults(model: type) -> Dict[str, Any]:
+    return {
+        name: field.default for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+
+def trusted_document(model: type, document: Dict[str, Any]) -> Dict[str, Any]:
+    fields = model.model_fields
+    return {**model_field_defaults(model), **{key: value for key, value in document.items() if key in fields}}
+
+
+def render_document(model: type, document: Dict[str, Any]) -> bytes:
+    if TRUSTED_DB_DOCUMENTS:
+        return orjson.dumps(trusted_document(model, document))
+    adapter = model_adapter(model)
+    return adapter.dump_json(adapter.validate_python(document))
+
+
+def render_documents(model: type, documents: List[Dict[str, Any]]) -> Response:
+    """Render stored documents as an array of model in the negotiated format"""
+    if response_format.get() == "msgpack":
+        if TRUSTED_DB_DOCUMENTS:
+            content = [trusted_document(model, document) for document in documents]
+        else:
+            adapter = model_list_adapter(model)
+            content = adapter.dump_python(adapter.validate_python(documents), mode="json")
+        return Response(content=pack_msgpack(content), media_type=MSGPACK_MEDIA_TYPES[0])
+    if TRUSTED_DB_DOCUMENTS:
+        body = orjson.dumps([trusted_document(model, document) for document in documents])
+    else:
+        adapter = model_list_adapter(model)
+        body = adapter.dump_json(adapter.validate_python(documents))
+    return Response(content=body, media_type="application/json")
+
+
+async def json_array_chunks(model: type, cursor):
+    """Encode documents into a JSON array as the cursor yields them, flushing about STREAM_CHUNK_BYTES at a time.
+
+    The cursor only fetches its next batch once the previous chunks have been
+    sent, so a slow client holds back the database reads instead of letting
+    the page pile up in memory.
+    """
+    chunk = bytearray(b"[")
+    separator = b""
+    async for document in cursor:
+        chunk += separator
+        chunk += render_document(model, document)
+        separator = b","
+        if len(chunk) >= STREAM_CHUNK_BYTES:
+            yield bytes(chunk)
+            chunk = bytearray()
+    chunk += b"]"
+    yield bytes(chunk)
+
+
+async def resume_chunks(first: bytes, chunks):
+    yield first
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except Exception:
+        # The 200 is already sent; re-raising makes the server drop the connection
+        # before the final chunk, so clients see a broken body rather than a short array
+        logger.exception("Aborting streamed response after a rendering error")
+        raise
+
+
+async def stream_documents(model: type, cursor) -> Response:
+    """Stream a cursor as a chunked JSON array of model.
+
+    The first chunk is rendered before the response starts, so a document
+    failing validation there still turns into an error status.
+    """
+    if response_format.get() == "msgpack":
+        # MessagePack arrays carry their length up front, so the page is packed whole
+        return render_documents(model, await cursor.to_list(None))
+    chunks = json_array_chunks(model, cursor)
+    first = await chunks.__anext__()
+    return StreamingResponse(resume_chunks(first, chunks), media_type="application/json")
+
+
+# Response compression
+# Responses are compressed with the best encoding both sides support once they
+# reach COMPRESSION_MINIMUM_BYTES. Cached bodies keep their compressed variants
+# next to the raw bytes, so each version is compressed once per encoding.
+COMPRESSION_MINIMUM_BYTES = 1024
+COMPRESSIBLE_MEDIA_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/geo+json", "application/msgpack"
+)
+PARTNERS_CACHE_TTL_SECONDS = 300
+DETAIL_CACHE_TTL_SECONDS = 30
+DETAIL_CACHE_MAX_ENTRIES = 500
+
+# Server preference order; brotli and zstd are offered only when installed
+SUPPORTED_ENCODINGS = [encoding for encoding, module in (("zstd", zstandard), ("br", brotli), ("gzip", zlib)) if module]
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the preferred supported encoding with the highest q-value in an Accept-Encoding header"""
+    weights = parse_quality_values(accept_encoding)
+    best, best_weight = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    """One-shot compression at high levels, for bodies that are cached and reused"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=12).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=9)
+    return gzip.compress(body, compresslevel=9)
+
+
+class StreamCompressor:
+    """Incremental compressor that flushes every chunk so streamed responses keep flowing"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=4)
+        else:
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "zstd":
+            return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """Compress compressible responses at or above a size threshold with the negotiated encoding.
+
+    Bodies are buffered until the threshold is reached, so small responses go
+    out untouched; responses that already carry a Content-Encoding (such as
+    precompressed cached bodies) pass straight through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        buffered = bytearray()
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_MEDIA_TYPES)
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is not None:
+                data = compressor.compress(body) if more_body else compressor.finish(body)
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            buffered.extend(body)
+            if len(buffered) < self.minimum_size:
+                if more_body:
+                    return
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                await send(start_message)
+                await send({"type": "http.response.body", "body": bytes(buffered)})
+                return
+
+            compressor = StreamCompressor(encoding)
+            data = compressor.compress(bytes(buffered)) if more_body else compressor.finish(bytes(buffered))
+            buffered.clear()
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(data))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class CompressedBody:
+    """Rendered response bytes with their compressed variants, computed on first request"""
+
+    def __init__(self, body: bytes, media_type: str = "application/json"):
+        self.body = body
+        self.media_type = media_type
+        self._variants: Dict[str, bytes] = {}
+
+    def variant(self, encoding: str) -> bytes:
+        if encoding not in self._variants:
+            self._variants[encoding] = compress_body(self.body, encoding)
+        return self._variants[encoding]
+
+    def response(self, request: Request, headers: Optional[Dict[str, str]] = None) -> Response:
+        headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is None or len(self.body) < COMPRESSION_MINIMUM_BYTES:
+            return Response(content=self.body, media_type=self.media_type, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(content=self.variant(encoding), media_type=self.media_type, headers=headers)
+
+
+partners_cache = TimedCache(PARTNERS_CACHE_TTL_SECONDS)
+# Keyed by client-chosen paging parameters, so kept small
+establishment_detail_cache = TimedCache(DETAIL_CACHE_TTL_SECONDS, DETAIL_CACHE_MAX_ENTRIES)
+
+
+# Offline catalogue snapshot
+# The whole catalogue in card projection, with approved review summaries, is
+# rebuilt in the background after establishment changes and published under a
+# content-derived version, so clients can cache each version forever and only
+# poll the small manifest. Versions are files in SNAPSHOT_DIR, shared by all
+# workers (a shared volume when they run on several hosts), so a manifest
+# served by one worker can be followed on any other.
+SNAPSHOT_CHECK_SECONDS = 30
+SNAPSHOT_MAX_AGE_SECONDS = 3600  # Also picks up changes written by other workers
+SNAPSHOT_KEPT_VERSIONS = 3
+SNAPSHOT_DIR = Path(os.environ.get('SNAPSHOT_DIR', ROOT_DIR / "snapshots"))
+SNAPSHOT_VERSION_RE = re.compile(r"^[0-9a-f]{16}$")
+SNAPSHOT_PROJECTION = {
+    **DETAIL_CARD_PROJECTION, "contact_info": 1, "opening_hours": 1, "special_hours": 1,
+    "sensory_info": 1, "event_start": 1, "event_end": 1,
+}
+SNAPSHOT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class CatalogueSnapshots:
+    """Snapshot versions stored as files, each with its compressed variants, plus the manifest built here"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.manifest: Optional[Dict[str, Any]] = None
+        self.dirty = True
+        self.built_at = 0.0
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def due(self) -> bool:
+        return self.dirty or time.monotonic() - self.built_at >= SNAPSHOT_MAX_AGE_SECONDS
+
+    def path(self, version: str, encoding: Optional[str] = None) -> Path:
+        return self.directory / (f"{version}.json.{encoding}" if encoding else f"{version}.json")
+
+    def write(self, version: str, snapshot: CompressedBody) -> Dict[str, int]:
+        """Store a version unless another worker already did; returns the encoded sizes. Blocking."""
+        if self.path(version).exists():
+            self.path(version).touch()  # Newest again, so pruning keeps it
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Variants first and the plain body last: a version is visible only once complete
+            for encoding in [*SUPPORTED_ENCODINGS, None]:
+                target = self.path(version, encoding)
+                temporary = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+                temporary.write_bytes(snapshot.variant(encoding) if encoding else snapshot.body)
+                os.replace(temporary, target)
+        return {
+            encoding: self.path(version, encoding).stat().st_size
+            for encoding in SUPPORTED_ENCODINGS if self.path(version, encoding).exists()
+        }
+
+    def prune(self, keep: str):
+        """Delete all but the newest versions, never the one just published. Blocking."""
+        versions = sorted(self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for path in versions[SNAPSHOT_KEPT_VERSIONS:]:
+            if path.stem != keep:
+                for variant in self.directory.glob(f"{path.stem}.json*"):
+                    variant.unlink(missing_ok=True)
+
+    def response(self, version: str, request: Request, headers: Dict[str, str]) -> Optional[Response]:
+        if not SNAPSHOT_VERSION_RE.match(version) or not self.path(version).exists():
+            return None
+        headers = {**headers, "Vary": "Accept-Encoding"}
+        path = self.path(version)
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        # A worker built without an optional codec may have stored fewer variants
+        if encoding is not None and path.stat().st_size >= COMPRESSION_MINIMUM_BYTES and self.path(version, encoding).exists():
+            headers["Content-Encoding"] = encoding
+            path = self.path(version, encoding)
+        return FileResponse(path, media_type="application/json", headers=headers)
+
+
+catalogue_snapshots = CatalogueSnapshots(SNAPSHOT_DIR)
+
+
+async def build_catalogue_snapshot():
+    # Cleared before reading so changes made during the build trigger another one
+    catalogue_snapshots.dirty = False
+    establishments, summaries = await asyncio.gather(
+        db.establishments.find({}, SNAPSHOT_PROJECTION).sort("id", 1).to_list(None),
+        approved_review_summaries(),
+    )
+    for est in establishments:
+        est["review_summary"] = summaries.get(est["id"]) or review_summary_from_row(None)
+    body = orjson.dumps({"establishments": establishments}, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+    digest = hashlib.sha256(body).hexdigest()
+    version = digest[:16]
+    catalogue_snapshots.built_at = time.monotonic()
+    if catalogue_snapshots.manifest and catalogue_snapshots.manifest["version"] == version:
+        return
+
+    # Compression and file writes run off the event loop, so requests only stream files
+    encoded_sizes = await asyncio.to_thread(catalogue_snapshots.write, version, CompressedBody(body))
+    catalogue_snapshots.manifest = {
+        "version": version,
+        "url": f"{api_router.prefix}/snapshots/{version}",
+        "sha256": digest,
+        "generated_at": datetime.utcnow(),
+        "establishments": len(establishments),
+        "bytes": len(body),
+        "encoded_bytes": encoded_sizes,
+    }
+    await asyncio.to_thread(catalogue_snapshots.prune, version)
+
+
+async def refresh_catalogue_snapshot_periodically():
+    while True:
+        if catalogue_snapshots.due():
+            try:
+                await build_catalogue_snapshot()
+            except Exception:
+                catalogue_snapshots.dirty = True
+                logger.exception("Failed to build the catalogue snapshot")
+        await asyncio.sleep(SNAPSHOT_CHECK_SECONDS)
+
+
+# Delta sync
+# Clients keep a change token, the (timestamp, id) of the last change they saw,
+# and fetch establishments updated and tombstones of those deleted after it,
+# in timestamp order. Changes newer than SYNC_SETTLE_SECONDS are held back so
+# writes still in flight cannot land behind a token already handed out.
+SYNC_SETTLE_SECONDS = 2
+SYNC_MAX_PAGE = 500
+TOMBSTONE_RETENTION_DAYS = 90
+SYNC_DOCUMENT_PROJECTION = {"_id": 0, "hours_index": 0, "review_totals": 0}
+
+
+def after_change_token(field: str, since: Optional[Dict[str, Any]], until: datetime) -> Dict[str, Any]:
+    query: Dict[str, Any] = {field: {"$lt": until}}
+    if since:
+        query["$or"] = [
+            {field: {"$gt": since["at"], "$lt": until}},
+            {field: since["at"], "id": {"$gt": since["id"]}},
+        ]
+    return query
+
+
+async def establishment_changes(since: Optional[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    until = datetime.utcnow() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    updated, deleted = await asyncio.gather(
+        db.establishments.find(after_change_token("updated_at", since, until), SYNC_DOCUMENT_PROJECTION)
+        .sort([("updated_at", 1), ("id", 1)]).to_list(limit + 1),
+        db.establishment_tombstones.find(after_change_token("deleted_at", since, until), {"_id": 0})
+        .sort([("deleted_at", 1), ("id", 1)]).to_list(limit + 1),
+    )
+    # Merge both streams by (timestamp, id) and keep the first page
+    changes = sorted(
+        [(est["updated_at"], est["id"], est) for est in updated]
+        + [(tombstone["deleted_at"], tombstone["id"], None) for tombstone in deleted],
+        key=lambda change: change[:2],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    if changes:
+        last_at, last_id, _ = changes[-1]
+        token = {"at": last_at, "id": last_id}
+    else:
+        token = since
+    return {
+        "changed": model_list_adapter(Establishment).validate_python([est for _, _, est in changes if est]),
+        "deleted": [est_id for _, est_id, est in changes if est is None],
+        "next_token": encode_cursor(token) if token else None,
+        "has_more": has_more,
+    }
+
+
+# Change log
+# Every mutating route appends compact change events to the change_log
+# collection right after its write. Sequence numbers are allocated from a
+# counter, so concurrent writers can commit events out of order and a failed
+# append leaves a gap: readers stop at the first gap until it is older than
+# CHANGE_LOG_GAP_SETTLE_SECONDS, then treat it as permanent.
+CHANGE_LOG_SEQUENCE_ID = "change_log_seq"
+CHANGE_LOG_MAX_PAGE = 1000
+CHANGE_LOG_MAX_WAIT_SECONDS = 30
+CHANGE_LOG_GAP_SETTLE_SECONDS = 5
+CHANGE_LOG_RETENTION_DAYS = 30
+
+
+class ChangeOperation(str, Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+# Set on every local append so waiting consumers wake up without polling
+change_log_appended = asyncio.Event()
+
+
+async def record_changes(entity: str, changes: List[Tuple[str, ChangeOperation, Optional[datetime]]]):
+    """Append (entity_id, operation, version) events for one entity type"""
+    global change_log_appended
+    if not changes:
+        return
+    counter = await db.counters.find_one_and_update(
+        {"_id": CHANGE_LOG_SEQUENCE_ID},
+        {"$inc": {"value": len(changes)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    first_seq = counter["value"] - len(changes) + 1
+    now = datetime.utcnow()
+    await db.change_log.insert_many([
+        {"seq": first_seq + offset, "entity": entity, "entity_id": entity_id,
+         "op": operation.value, "version": version or now, "at": now}
+        for offset, (entity_id, operation, version) in enumerate(changes)
+    ])
+    appended, change_log_appended = change_log_appended, asyncio.Event()
+    appended.set()
+
+
+async def record_change(entity: str, entity_id: str, operation: ChangeOperation, version: Optional[datetime] = None):
+    await record_changes(entity, [(entity_id, operation, version)])
+
+
+async def read_change_log(after: int, limit: int) -> List[Dict[str, Any]]:
+    """Events after a sequence number, up to the first gap that may still be filled"""
+    events = await db.change_log.find({"seq": {"$gt": after}}, {"_id": 0}).sort("seq", 1).to_list(limit)
+    settled_before = datetime.utcnow() - timedelta(seconds=CHANGE_LOG_GAP_SETTLE_SECONDS)
+    expected = after + 1
+    for position, event in enumerate(events):
+        if event["seq"] != expected and event["at"] > settled_before:
+            return events[:position]
+        expected = event["seq"] + 1
+    return events
+
+
+# Background jobs
+# Work that follows a write but is not part of it (rating aggregates, their
+# index refreshes and change events) runs on an in-process job queue, so write
+# endpoints return once the primary write is acknowledged.
+JOB_WORKERS = 4
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 1.0
+JOB_KEY_BUSY_SECONDS = 0.05
+JOB_LEASE_SECONDS = 60
+JOB_DRAIN_SECONDS = 10
+JOB_QUEUE_PERSISTENCE = os.environ.get('JOB_QUEUE_PERSISTENCE', '').lower() in ('1', 'true', 'yes')
+
+
+class JobQueue:
+    """In-process queue of keyed jobs run by a pool of worker tasks.
+
+    Enqueueing a job whose (name, key) is already pending merges the payloads
+    instead of queueing it twice, jobs with the same key never run concurrently,
+    and failed jobs are retried with exponential backoff. With persistence enabled, pending jobs are mirrored to the jobs
+    collection under a lease this process keeps renewing; jobs whose lease
+    lapsed (their process died) are adopted by another process.
+    """
+
+    def __init__(self, workers: int, max_attempts: int, persist: bool):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.persist = persist
+        self.owner = str(uuid.uuid4())
+        self.in_flight = 0
+        self.counts = {"enqueued": 0, "debounced": 0, "succeeded": 0, "retried": 0, "failed": 0}
+        self._handlers: Dict[str, Tuple[Any, Any]] = {}
+        self._pending: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._running: Set[Tuple[str, str]] = set()
+        self._ready: asyncio.Queue = asyncio.Queue()
+
+    def register(self, name: str, handler, merge=None):
+        """handler(key, payload) runs the job; merge(pending, new) combines debounced payloads"""
+        self._handlers[name] = (handler, merge or (lambda pending, new: new))
+
+    async def enqueue(self, name: str, key: str, payload: Any, delay: float = 0.0):
+        job_key = (name, key)
+        job = self._pending.get(job_key)
+        if job is not None:
+            job["payload"] = self._handlers[name][1](job["payload"], payload)
+            self.counts["debounced"] += 1
+            if self.persist:
+                await db.jobs.update_one({"_id": job["id"]}, {"$set": {"payload": job["payload"]}})
+            return
+        job = {"id": str(uuid.uuid4()), "name": name, "key": key, "payload": payload, "attempts": 0}
+        if self.persist:
+            # Stored before it can run, so a finished job is never written back
+            await db.jobs.insert_one({
+                "_id": job["id"], "name": name, "key": key, "payload": payload, "attempts": 0,
+                "status": "pending", "owner": self.owner, "lease_until": self._lease_deadline(),
+            })
+        self.counts["enqueued"] += 1
+        self._add_pending(job, delay)
+
+    def _add_pending(self, job: Dict[str, Any], delay: float):
+        job_key = (job["name"], job["key"])
+        self._pending[job_key] = job
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, job_key)
+        else:
+            self._ready.put_nowait(job_key)
+
+    def _lease_deadline(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+    async def _work(self):
+        while True:
+            job_key = await self._ready.get()
+            if job_key in self._running:
+                # Left pending, so further enqueues keep merging into it until the running job ends
+                asyncio.get_running_loop().call_later(JOB_KEY_BUSY_SECONDS, self._ready.put_nowait, job_key)
+                continue
+            job = self._pending.pop(job_key, None)
+            if job is None:
+                continue
+            self._running.add(job_key)
+            self.in_flight += 1
+            try:
+                await self._run(job)
+            except Exception:
+                logger.exception("Job queue bookkeeping failed for %s %s", job["name"], job["key"])
+            finally:
+                self._running.discard(job_key)
+                self.in_flight -= 1
+
+    async def _run(self, job: Dict[str, Any]):
+        handler, _ = self._handlers[job["name"]]
+        try:
+            await handler(job["key"], job["payload"])
+        except Exception:
+            job["attempts"] += 1
+            await self._retry_or_fail(job)
+            return
+        self.counts["succeeded"] += 1
+        if self.persist:
+            await db.jobs.delete_one({"_id": job["id"]})
+
+    async def _retry_or_fail(self, job: Dict[str, Any]):
+        if job["attempts"] >= self.max_attempts:
+            self.counts["failed"] += 1
+            logger.exception("Job %s for %s failed after %d attempts", job["name"], job["key"], job["attempts"])
+            if self.persist:
+                await db.jobs.update_one({"_id": job["id"]}, {"$set": {"status": "failed", "attempts": job["attempts"]}})
+            return
+        self.counts["retried"] += 1
+        logger.warning("Job %s for %s failed, retrying (attempt %d)", job["name"], job["key"], job["attempts"])
+        pending = self._pending.get((job["name"], job["key"]))
+        if pending is not None:
+            await self._absorb(job, pending)
+            return
+        if self.persist:
+            await db.jobs.update_one({"_id": job["id"]}, {"$set": {"attempts": job["attempts"]}})
+        self._add_pending(job, JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1))
+
+    async def _absorb(self, job: Dict[str, Any], pending: Dict[str, Any]):
+        """Fold an older job's payload into the pending job with the same key"""
+        pending["payload"] = self._handlers[job["name"]][1](job["payload"], pending["payload"])
+        if self.persist:
+            await db.jobs.update_one({"_id": pending["id"]}, {"$set": {"payload": pending["payload"]}})
+            await db.jobs.delete_one({"_id": job["id"]})
+
+    async def _maintain_leases(self):
+        while True:
+            try:
+                await db.jobs.update_many(
+                    {"owner": self.owner, "status": "pending"}, {"$set": {"lease_until": self._lease_deadline()}}
+                )
+                await self._adopt_orphans()
+            except Exception:
+                logger.exception("Failed to maintain job leases")
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+
+    async def _adopt_orphans(self):
+        while True:
+            document = await db.jobs.find_one_and_update(
+                {"status": "pending", "lease_until": {"$lt": datetime.utcnow()}, "name": {"$in": list(self._handlers)}},
+                {"$set": {"owner": self.owner, "lease_until": self._lease_deadline()}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if document is None:
+                return
+            job = {key: document[key] for key in ("name", "key", "payload", "attempts")}
+            job["id"] = document["_id"]
+            pending = self._pending.get((job["name"], job["key"]))
+            if pending is not None:
+                await self._absorb(job, pending)
+            else:
+                self._add_pending(job, 0)
+
+    def start(self) -> List[asyncio.Task]:
+        tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        if self.persist:
+            tasks.append(asyncio.create_task(self._maintain_leases()))
+        return tasks
+
+    async def drain(self, timeout: float):
+        """Wait for queued and running jobs to finish, up to timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while (self._pending or self.in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    def metrics(self) -> Dict[str, Any]:
+        depth: Dict[str, int] = {}
+        for name, _ in self._pending:
+            depth[name] = depth.get(name, 0) + 1
+        return {
+            "pending": len(self._pending),
+            "pending_by_job": depth,
+            "in_flight": self.in_flight,
+            "workers": self.workers,
+            "persistent": self.persist,
+            **self.counts,
+        }
+
+
+job_queue = JobQueue(JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_QUEUE_PERSISTENCE)
+
+
+async def run_review_totals_job(establishment_id: str, _payload: None):
+    await recompute_review_totals([establishment_id])
+
+
+job_queue.register("review_totals", run_review_totals_job)
+# Jobs persisted before totals were recomputed carry a delta, which is ignored
+job_queue.register("review_deltas", run_review_totals_job)
+
+
+async def enqueue_review_totals(establishment_ids: Iterable[str]):
+    """Queue review total recomputation; repeated changes to one establishment collapse into one run"""
+    for est_id in establishment_ids:
+        await job_queue.enqueue("review_totals", est_id, None)
+
+
+# Request metrics
+# MetricsMiddleware records per-route request counts by status, latency
+# histograms and in-flight gauges, rendered in the Prometheus text format at
+# /metrics. Routes are labelled by their path template so ids do not create
+# new series; requests that match no route share one label.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+UNMATCHED_ROUTE = "unmatched"
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
 
 
-class EstablishmentUpdate(BaseModel):
-    name: Optional[str] = None
-    type: Optional[EstablishmentType] = None
-    description: Optional[str] = None
-    address: Optional[str] = None
-    coordinates: Optional[Dict[str, float]] = None
-    accessibility_features: Optional[List[AccessibilityFeature]] = None
-    certified_autism_friendly: Optional[bool] = None
-    certification_date: Optional[datetime] = None
-    contact_info: Optional[Dict[str, str]] = None
-    opening_hours: Optional[Dict[str, str]] = None
-    special_hours: Optional[List[str]] = None
-    sensory_info: Optional[Dict[str, Any]] = None
-    images: Optional[List[str]] = None
+class LatencyHistogram:
+    """Cumulative-bucket histogram with the running sum and count"""
 
+    __slots__ = ("buckets", "counts", "total", "count")
 
-class ReviewCreate(BaseModel):
-    user_id: str
-    rating: int = Field(ge=1, le=5)
-    noise_level: SensoryLevel
-    lighting_level: SensoryLevel
-    visual_clarity: SensoryLevel
-    staff_helpfulness: int = Field(ge=1, le=5)
-    calm_areas_available: bool
-    comment: str = ""
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
 
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
 
-class Review(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    establishment_id: str
-    user_id: str
-    user_name: str = ""
-    rating: int = Field(ge=1, le=5)
-    noise_level: SensoryLevel
-    lighting_level: SensoryLevel
-    visual_clarity: SensoryLevel
-    staff_helpfulness: int = Field(ge=1, le=5)
-    calm_areas_available: bool
-    comment: str = ""
-    status: str = "pending"
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    approved_at: Optional[datetime] = None
-    approved_by: Optional[str] = None  # Admin user ID
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket, like histogram_quantile()"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
 
+    def render(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == math.inf else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
 
-class Partner(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    logo_url: str
-    website_url: str = ""
-    description: str = ""
-    is_active: bool = True
-    display_order: int = 0
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+def prometheus_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
 
-class PartnerCreate(BaseModel):
-    name: str
-    logo_url: str
-    website_url: str = ""
-    description: str = ""
-    is_active: bool = True
-    display_order: int = 0
 
+class RequestMetrics:
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.in_flight: Dict[str, int] = {}
 
-class PartnerUpdate(BaseModel):
-    name: Optional[str] = None
-    logo_url: Optional[str] = None
-    website_url: Optional[str] = None
-    description: Optional[str] = None
-    is_active: Optional[bool] = None
-    display_order: Optional[int] = None
+    def started(self, method: str):
+        self.in_flight[method] = self.in_flight.get(method, 0) + 1
+
+    def finished(self, method: str, route: str, status: int, seconds: float):
+        self.in_flight[method] -= 1
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = LatencyHistogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP http_requests_total Requests handled, by route and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'http_requests_total{{method="{method}",route="{prometheus_label(route)}",status="{status}"}} {count}')
+        lines += [
+            "# HELP http_request_duration_seconds Request latency until the response is fully sent.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            lines += histogram.render("http_request_duration_seconds", f'method="{method}",route="{prometheus_label(route)}"')
+        lines += [
+            "# HELP http_request_duration_quantile_seconds Latency quantiles estimated from the histogram buckets.",
+            "# TYPE http_request_duration_quantile_seconds gauge",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            for q in LATENCY_QUANTILES:
+                lines.append(
+                    f'http_request_duration_quantile_seconds{{method="{method}",route="{prometheus_label(route)}",'
+                    f'quantile="{q}"}} {histogram.quantile(q)}'
+                )
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for method, count in sorted(self.in_flight.items()):
+            lines.append(f'http_requests_in_flight{{method="{method}"}} {count}')
+        return lines
+
+
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """Record the outcome and latency of every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+        request_metrics.started(method)
+        origin = command_origin.set(f"{method} {scope['path']}")
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            command_origin.reset(origin)
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            request_metrics.finished(
+                method, route.path if route is not None else UNMATCHED_ROUTE, status, time.perf_counter() - started
+            )
+
+
+def job_queue_metric_lines() -> List[str]:
+    metrics = job_queue.metrics()
+    lines = [
+        "# HELP jobs_pending Background jobs waiting to run, by job name.",
+        "# TYPE jobs_pending gauge",
+    ]
+    lines += [f'jobs_pending{{job="{name}"}} {count}' for name, count in sorted(metrics["pending_by_job"].items())]
+    lines += [
+        "# HELP jobs_in_flight Background jobs currently running.",
+        "# TYPE jobs_in_flight gauge",
+        f"jobs_in_flight {metrics['in_flight']}",
+        "# HELP jobs_total Background job outcomes.",
+        "# TYPE jobs_total counter",
+    ]
+    lines += [f'jobs_total{{outcome="{outcome}"}} {metrics[outcome]}'
+              for outcome in ("enqueued", "debounced", "succeeded", "retried", "failed")]
+    return lines
+
+
+def command_metric_lines() -> List[str]:
+    _, latency, failures = command_monitor.snapshot()
+    lines = [
+        "# HELP mongodb_command_duration_seconds MongoDB command latency by collection and command.",
+        "# TYPE mongodb_command_duration_seconds histogram",
+    ]
+    for (collection, command), histogram in sorted(latency.items()):
+        lines += histogram.render("mongodb_command_duration_seconds", f'collection="{collection}",command="{command}"')
+    lines += [
+        "# HELP mongodb_command_failures_total Failed MongoDB commands by collection and command.",
+        "# TYPE mongodb_command_failures_total counter",
+    ]
+    for (collection, command), count in sorted(failures.items()):
+        lines.append(f'mongodb_command_failures_total{{collection="{collection}",command="{command}"}} {count}')
+    return lines
+
+
+async def explain_slow_commands():
+    """Attach the query plan to slow reads captured by the command monitor"""
+    while True:
+        entry, target, database = await command_monitor.next_explain()
+        try:
+            plan = await client[database].command({"explain": target, "verbosity": "queryPlanner"})
+            entry["explain"] = json.loads(json.dumps(plan, default=json_default))
+        except Exception as e:
+            entry["explain"] = {"error": str(e)}
 
 
 # API Routes
@@ -241,27 +3403,84 @@ async def root():
 # Status check endpoints (keeping existing ones)
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
+    status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    _ = await db.status_checks.insert_one(status_obj.model_dump())
+    await record_change("status_check", status_obj.id, ChangeOperation.CREATE, status_obj.timestamp)
     return status_obj
 
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    return await stream_documents(StatusCheck, db.status_checks.find({}, {"_id": 0}).limit(1000))
 
 
 # User Profile endpoints
 @api_router.post("/users", response_model=UserProfile)
 async def create_user_profile(user: UserProfileCreate):
-    user_dict = user.dict()
+    user_dict = user.model_dump()
     user_obj = UserProfile(**user_dict)
-    result = await db.users.insert_one(user_obj.dict())
+    user_doc = user_obj.model_dump()
+    user_doc.update(user_search_fields(user_doc))
+    try:
+        result = await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Email already registered")
+    await record_change("user", user_obj.id, ChangeOperation.CREATE, user_obj.updated_at)
     return user_obj
 
 
+@api_router.get("/users/by-email", response_model=UserProfile)
+async def get_user_by_email(email: str):
+    """Look up a user by email (case-insensitive)"""
+    user = await db.users.find_one({"email_key": search_key(email)})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return UserProfile(**user)
+
+
+@api_router.get("/users/search", response_model=UserSearchPage)
+async def search_users(
+    q: Optional[str] = None,
+    sort: str = Query("name", pattern="^(name|created_at)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(25, ge=1, le=USER_SEARCH_MAX_LIMIT)
+):
+    """Prefix search on name or email with sorted cursor pagination (admin endpoint)"""
+    conditions: List[Dict[str, Any]] = []
+    if q and search_key(q):
+        prefix = {"$regex": "^" + re.escape(search_key(q))}
+        conditions.append({"$or": [{"name_key": prefix}, {"email_key": prefix}]})
+
+    sort_fields = USER_SORTS[sort]
+    if cursor:
+        sort_field, direction = sort_fields[0]
+        position = decode_cursor(cursor, {sort_field: datetime if sort_field == "created_at" else str, "id": str})
+        last_value = position[sort_field]
+        operator = "$gt" if direction == 1 else "$lt"
+        conditions.append({"$or": [
+            {sort_field: {operator: last_value}},
+            {sort_field: last_value, "id": {operator: position["id"]}},
+        ]})
+
+    query = {"$and": conditions} if conditions else {}
+    users, estimated_total = await asyncio.gather(
+        db.users.find(query).sort(sort_fields).to_list(limit + 1),
+        db.users.estimated_document_count(),
+    )
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        last = users[-1]
+        next_cursor = encode_cursor({sort_fields[0][0]: last.get(sort_fields[0][0]), "id": last["id"]})
+
+    return UserSearchPage(
+        items=[UserProfile(**user) for user in users],
+        next_cursor=next_cursor,
+        estimated_total=estimated_total,
+    )
+
+
 @api_router.get("/users/{user_id}", response_model=UserProfile)
 async def get_user_profile(user_id: str):
     user = await db.users.find_one({"id": user_id})
@@ -272,36 +3491,108 @@ async def get_user_profile(user_id: str):
 
 @api_router.put("/users/{user_id}", response_model=UserProfile)
 async def update_user_profile(user_id: str, user_update: UserProfileUpdate):
-    update_data = {k: v for k, v in user_update.dict().items() if v is not None}
+    update_data = {k: v for k, v in user_update.model_dump().items() if v is not None}
+    update_data.update(user_search_fields(update_data))
     update_data["updated_at"] = datetime.utcnow()
     
-    result = await db.users.update_one(
+    updated_user = await db.users.find_one_and_update(
         {"id": user_id},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if updated_user is None:
         raise HTTPException(status_code=404, detail="User not found")
+    await record_change("user", user_id, ChangeOperation.UPDATE, updated_user["updated_at"])
     
-    updated_user = await db.users.find_one({"id": user_id})
     return UserProfile(**updated_user)
 
 
 @api_router.get("/users", response_model=List[UserProfile])
 async def get_all_users(skip: int = 0, limit: int = 100):
-    users = await db.users.find().skip(skip).limit(limit).to_list(limit)
-    return [UserProfile(**user) for user in users]
+    return await stream_documents(UserProfile, db.users.find({}, {"_id": 0}).skip(skip).limit(limit))
 
 
 # Establishment endpoints
 @api_router.post("/establishments", response_model=Establishment)
 async def create_establishment(establishment: EstablishmentCreate):
-    est_dict = establishment.dict()
+    est_dict = establishment.model_dump()
+    normalize_event_times(est_dict)
     est_obj = Establishment(**est_dict)
-    result = await db.establishments.insert_one(est_obj.dict())
+    est_doc = est_obj.model_dump()
+    est_doc["municipality"] = est_obj.municipality = municipality_locator.locate(est_doc["coordinates"])
+    est_doc["hours_index"] = build_hours_index(est_doc)
+    est_doc["review_totals"] = empty_review_totals()
+    result = await db.establishments.insert_one(est_doc)
+    index_establishment(est_doc)
+    await record_change("establishment", est_obj.id, ChangeOperation.CREATE, est_obj.updated_at)
     return est_obj
 
 
+@api_router.post("/establishments/import")
+async def import_establishments(request: Request, format: Optional[str] = None):
+    """Bulk import establishments from a streamed NDJSON or CSV body.
+
+    Rows with an external_id are upserted by that key, others are inserted.
+    Rows are validated and written in batches as they arrive, and failures
+    are reported by the line a row starts on (1-based, counting the CSV
+    header as line 1; quoted CSV fields may span lines).
+    """
+    content_type = request.headers.get("content-type", "")
+    is_csv = format == "csv" if format else "csv" in content_type
+    report = ImportReport()
+    batch: List[Tuple[int, Dict[str, Any], List[str]]] = []
+    header: Optional[List[str]] = None
+    lines = iter_stream_lines(request.stream())
+
+    async for row_number, record in (iter_csv_records(lines) if is_csv else iter_ndjson_records(lines)):
+        if is_csv and header is None and not isinstance(record, ValueError):
+            header = [column.strip() for column in record]
+            continue
+
+        report.received += 1
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            if is_csv:
+                row = csv_row_to_establishment(header, record)
+            else:
+                row = json.loads(record)
+                if not isinstance(row, dict):
+                    raise ValueError("Expected a JSON object")
+            document, fields = prepare_import_row(row)
+        except HTTPException as e:
+            report.add_error(row_number, e.detail)
+            continue
+        except ValueError as e:
+            # Includes JSON decode and Pydantic validation errors
+            report.add_error(row_number, str(e))
+            continue
+
+        batch.append((row_number, document, fields))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush_import_batch(batch, report)
+            batch = []
+
+    await flush_import_batch(batch, report)
+    return report.summary()
+
+
+@api_router.get("/establishments/changes")
+async def get_establishment_changes(
+    since: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=SYNC_MAX_PAGE)
+):
+    """Establishments changed and ids deleted after a change token, oldest first"""
+    position = None
+    if since:
+        position = decode_cursor(since, {"at": datetime, "id": str}, "Invalid change token")
+        if position["at"] < datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            raise HTTPException(status_code=410, detail="Change token expired, resync from the snapshot")
+    return await establishment_changes(position, limit)
+
+
 @api_router.get("/establishments/{establishment_id}", response_model=Establishment)
 async def get_establishment(establishment_id: str):
     establishment = await db.establishments.find_one({"id": establishment_id})
@@ -310,20 +3601,118 @@ async def get_establishment(establishment_id: str):
     return Establishment(**establishment)
 
 
+@api_router.get("/establishments/{establishment_id}/detail")
+async def get_establishment_detail(
+    establishment_id: str,
+    request: Request,
+    reviews_cursor: Optional[str] = None,
+    reviews_limit: int = Query(10, ge=1, le=50),
+    nearby_limit: int = Query(5, ge=0, le=20),
+    nearby_km: float = Query(10.0, gt=0)
+):
+    """Establishment, approved reviews, review summary and nearby venues in one round trip"""
+
+    async def render_detail() -> CompressedBody:
+        establishment, reviews, review_summary, nearby = await asyncio.gather(
+            db.establishments.find_one({"id": establishment_id}),
+            approved_reviews_page(establishment_id, reviews_cursor, reviews_limit),
+            approved_review_summary(establishment_id),
+            nearby_establishments(establishment_id, nearby_limit, nearby_km),
+        )
+        if not establishment:
+            raise HTTPException(status_code=404, detail="Establishment not found")
+        rendered = NegotiatedResponse({
+            "establishment": Establishment(**establishment).model_dump(mode="json"),
+            "reviews": reviews,
+            "review_summary": review_summary,
+            "nearby": nearby,
+        })
+        return CompressedBody(rendered.body, rendered.media_type)
+
+    cache_key = f"{establishment_id}:{reviews_cursor}:{reviews_limit}:{nearby_limit}:{nearby_km}:{response_format.get()}"
+    detail = await establishment_detail_cache.get_or_compute(cache_key, render_detail)
+    return detail.response(request)
+
+
 @api_router.put("/establishments/{establishment_id}", response_model=Establishment)
 async def update_establishment(establishment_id: str, est_update: EstablishmentUpdate):
-    update_data = {k: v for k, v in est_update.dict().items() if v is not None}
+    update_data = {k: v for k, v in est_update.model_dump().items() if v is not None}
+    if "event_start" in update_data or "event_end" in update_data:
+        normalize_event_times(update_data, default_end=False)
+    if "coordinates" in update_data:
+        update_data["municipality"] = municipality_locator.locate(update_data["coordinates"])
+    # With both hour fields present the parsed hours can be written in the same update
+    hours_changed = "opening_hours" in update_data or "special_hours" in update_data
+    if "opening_hours" in update_data and "special_hours" in update_data:
+        update_data["hours_index"] = build_hours_index(update_data)
+        hours_changed = False
     update_data["updated_at"] = datetime.utcnow()
     
-    result = await db.establishments.update_one(
+    updated_establishment = await db.establishments.find_one_and_update(
         {"id": establishment_id},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"_id": 0, "review_totals": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if updated_establishment is None:
         raise HTTPException(status_code=404, detail="Establishment not found")
-    
-    updated_establishment = await db.establishments.find_one({"id": establishment_id})
+
+    # Otherwise keep the parsed hours in sync with the merged free-text hours
+    if hours_changed:
+        updated_establishment["hours_index"] = build_hours_index(updated_establishment)
+        await db.establishments.update_one(
+            {"id": establishment_id},
+            {"$set": {"hours_index": updated_establishment["hours_index"]}}
+        )
+
+    index_establishment(updated_establishment)
+    await record_change("establishment", establishment_id, ChangeOperation.UPDATE, updated_establishment["updated_at"])
+    return Establishment(**updated_establishment)
+
+
+@api_router.patch("/establishments/{establishment_id}", response_model=Establishment)
+async def patch_establishment(establishment_id: str, request: Request):
+    """Partially update an establishment with a JSON Patch or JSON Merge Patch document"""
+    try:
+        patch = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if isinstance(patch, list):
+        compiler = compile_json_patch(patch)
+    elif isinstance(patch, dict) and JSON_PATCH_MEDIA_TYPE not in request.headers.get("content-type", ""):
+        compiler = compile_merge_patch(patch)
+    else:
+        raise HTTPException(status_code=400, detail="Expected a JSON Patch array or a merge patch object")
+
+    if not compiler.stages:
+        raise HTTPException(status_code=400, detail="Patch contains no changes")
+
+    updated_establishment = await db.establishments.find_one_and_update(
+        compiler.filter(establishment_id),
+        compiler.stages + [{"$set": {"updated_at": {"$literal": datetime.utcnow()}}}],
+        projection={"_id": 0, "review_totals": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if updated_establishment is None:
+        if await db.establishments.count_documents({"id": establishment_id}, limit=1):
+            raise HTTPException(status_code=409, detail="Patch test failed or array index out of range")
+        raise HTTPException(status_code=404, detail="Establishment not found")
+
+    # Refresh data derived from the patched fields
+    derived: Dict[str, Any] = {}
+    touched = compiler.touched_fields
+    if touched & {"opening_hours", "special_hours"}:
+        derived["hours_index"] = build_hours_index(updated_establishment)
+    if "coordinates" in touched:
+        derived["municipality"] = municipality_locator.locate(updated_establishment.get("coordinates", {}))
+    if derived:
+        await db.establishments.update_one({"id": establishment_id}, {"$set": derived})
+        updated_establishment.update(derived)
+
+    index_establishment(updated_establishment)
+    await record_change("establishment", establishment_id, ChangeOperation.UPDATE, updated_establishment["updated_at"])
     return Establishment(**updated_establishment)
 
 
@@ -332,6 +3721,13 @@ async def delete_establishment(establishment_id: str):
     result = await db.establishments.delete_one({"id": establishment_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Establishment not found")
+    await db.establishment_tombstones.update_one(
+        {"id": establishment_id},
+        {"$set": {"deleted_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    unindex_establishment(establishment_id)
+    await record_change("establishment", establishment_id, ChangeOperation.DELETE)
     return {"message": "Establishment deleted successfully"}
 
 
@@ -342,10 +3738,27 @@ async def get_establishments(
     type: Optional[EstablishmentType] = None,
     certified_only: bool = False,
     features: Optional[List[AccessibilityFeature]] = Query(None),
-    min_rating: Optional[float] = None
+    min_rating: Optional[float] = None,
+    open_now: bool = False,
+    open_at: Optional[datetime] = None,
+    quiet_hours_now: bool = False
 ):
     # Build filter query
     filter_query = {}
+
+    # Time-based filters are answered from the in-memory hours index
+    # open_at moves every time filter, quiet hours included, to that moment
+    matching_ids: Optional[Set[str]] = None
+    minute = minute_of_week(open_at or datetime.now(LOCAL_TZ))
+    if open_now or open_at is not None:
+        matching_ids = open_hours_index.at(minute)
+    if quiet_hours_now:
+        quiet_ids = quiet_hours_index.at(minute)
+        matching_ids = quiet_ids if matching_ids is None else matching_ids & quiet_ids
+    if matching_ids is not None:
+        if not matching_ids:
+            return []
+        filter_query["id"] = {"$in": list(matching_ids)}
     
     if type:
         filter_query["type"] = type
@@ -359,8 +3772,143 @@ async def get_establishments(
     if min_rating is not None:
         filter_query["autism_rating"] = {"$gte": min_rating}
     
-    establishments = await db.establishments.find(filter_query).skip(skip).limit(limit).to_list(limit)
-    return [Establishment(**est) for est in establishments]
+    cursor = db.establishments.find(filter_query, {"_id": 0, "hours_index": 0, "review_totals": 0})
+    return await stream_documents(Establishment, cursor.skip(skip).limit(limit))
+
+
+# Events endpoints
+@api_router.get("/events/upcoming", response_model=List[Establishment])
+async def get_upcoming_events(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=EVENTS_MAX_LIMIT)
+):
+    """Get events overlapping a date range (defaults to the next 30 days), optionally near a point"""
+    now = datetime.utcnow()
+    range_start = max(to_naive_utc(start), now) if start else now
+    range_end = to_naive_utc(end) if end else range_start + timedelta(days=30)
+    if range_end < range_start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    near = lat is not None and lng is not None and radius_km is not None
+
+    def in_radius(coordinates: Optional[Dict[str, float]]) -> bool:
+        # Events without coordinates never match a radius search
+        return not near or (
+            bool(coordinates) and "lat" in coordinates and "lng" in coordinates
+            and haversine_km(lat, lng, coordinates["lat"], coordinates["lng"]) <= radius_km
+        )
+
+    if upcoming_events_index.covers(range_end):
+        upcoming_events_index.prune(now)
+        candidates = upcoming_events_index.overlapping(range_start, range_end)
+        event_ids = [event_id for event_id, coordinates in candidates if in_radius(coordinates)][:limit]
+        if not event_ids:
+            return []
+        events = await db.establishments.find({"id": {"$in": event_ids}}).to_list(len(event_ids))
+        events.sort(key=lambda est: est["event_start"])
+        return render_documents(Establishment, events)
+
+    # Beyond the in-memory window: fall back to the (type, event_end) index
+    cursor = db.establishments.find({
+        "type": EstablishmentType.EVENT,
+        "event_end": {"$gte": range_start},
+        "event_start": {"$lte": range_end},
+    }).sort("event_start", 1)
+    if not near:
+        cursor = cursor.limit(limit)
+    events = []
+    async for est in cursor:
+        if in_radius(est.get("coordinates")):
+            events.append(est)
+            if len(events) >= limit:
+                break
+    await cursor.close()
+    return render_documents(Establishment, events)
+
+
+# Itinerary endpoints
+@api_router.post("/itineraries")
+async def plan_itinerary(request: ItineraryRequest):
+    """Plan a low-sensory day out: an ordered route of stops that are open and calm enough"""
+    if "lat" not in request.start or "lng" not in request.start:
+        raise HTTPException(status_code=400, detail="start must include lat and lng")
+
+    filter_query: Dict[str, Any] = {}
+    if request.establishment_ids:
+        filter_query["id"] = {"$in": request.establishment_ids}
+    if request.type:
+        filter_query["type"] = request.type
+    if request.certified_only:
+        filter_query["certified_autism_friendly"] = True
+    if request.features:
+        filter_query["accessibility_features"] = {"$all": request.features}
+    if request.min_autism_rating is not None:
+        filter_query["autism_rating"] = {"$gte": request.min_autism_rating}
+
+    origin = (request.start["lat"], request.start["lng"])
+    if not request.establishment_ids:
+        # Filters alone can match the whole catalogue: keep the candidates nearest the start
+        matches = await db.establishments.find(
+            filter_query, {"_id": 0, "id": 1, "sensory_info.noise_level": 1}
+        ).to_list(None)
+        matching_ids = [est["id"] for est in matches if passes_sensory_threshold(est, request.max_noise_level)]
+        filter_query = {"id": {"$in": coordinate_index.nearest_to(origin, matching_ids, ITINERARY_MAX_CANDIDATES)}}
+
+    projection = {"_id": 0, "id": 1, "name": 1, "type": 1, "address": 1, "coordinates": 1,
+                  "sensory_info": 1, "autism_rating": 1, "hours_index": 1}
+    candidates = await db.establishments.find(filter_query, projection).to_list(
+        len(request.establishment_ids) or ITINERARY_MAX_CANDIDATES
+    )
+    candidates = [est for est in candidates if passes_sensory_threshold(est, request.max_noise_level)]
+    by_id = {est["id"]: est for est in candidates}
+
+    keys, matrix, from_origin = coordinate_index.submatrix(list(by_id), origin)
+    hours = [by_id[key].get("hours_index", {}).get("open", []) for key in keys]
+    start_time = request.start_time or datetime.now(LOCAL_TZ)
+    start_minute = minute_of_week(start_time)
+
+    order = plan_route(matrix, from_origin, hours, start_minute, request)
+    schedule = schedule_route(order, matrix, from_origin, hours, start_minute, request) or []
+
+    local_start = (start_time.astimezone(LOCAL_TZ) if start_time.tzinfo else start_time).replace(second=0, microsecond=0)
+    stops = []
+    for stop, visit_start, leg in schedule:
+        arrival = local_start + timedelta(minutes=visit_start - start_minute)
+        est = by_id[keys[stop]]
+        stops.append({
+            "establishment_id": est["id"],
+            "name": est["name"],
+            "type": est["type"],
+            "address": est["address"],
+            "coordinates": est["coordinates"],
+            "autism_rating": est.get("autism_rating", 0.0),
+            "arrival": arrival,
+            "departure": arrival + timedelta(minutes=request.visit_minutes),
+            "leg_distance_km": round(leg, 2),
+        })
+
+    planned = {stop["establishment_id"] for stop in stops}
+    return {
+        "stops": stops,
+        "total_distance_km": round(route_distance(order, matrix, from_origin), 2),
+        "skipped": [est_id for est_id in request.establishment_ids if est_id not in planned],
+    }
+
+
+# Municipality endpoints
+@api_router.get("/municipalities/stats")
+async def get_municipality_stats(municipality: Optional[str] = None):
+    """Per-municipality venue, certification, rating and review totals"""
+    stats = municipality_rollup.stats()
+    if municipality:
+        stats = [row for row in stats if row["municipality"].lower() == municipality.lower()]
+        if not stats:
+            raise HTTPException(status_code=404, detail="Municipality not found")
+    return stats
 
 
 # Review endpoints
@@ -371,59 +3919,35 @@ async def add_review(establishment_id: str, review: ReviewCreate):
     if not establishment:
         raise HTTPException(status_code=404, detail="Establishment not found")
     
-    review_dict = review.dict()
+    review_dict = review.model_dump()
     review_obj = EstablishmentReview(**review_dict)
     
     # Add review to establishment
     await db.establishments.update_one(
         {"id": establishment_id},
         {
-            "$push": {"reviews": review_obj.dict()},
+            "$push": {"reviews": review_obj.model_dump()},
             "$set": {"updated_at": datetime.utcnow()}
         }
     )
     
-    # Recalculate ratings
-    updated_establishment = await db.establishments.find_one({"id": establishment_id})
-    reviews = updated_establishment.get("reviews", [])
-    
-    if reviews:
-        avg_rating = sum(r["rating"] for r in reviews) / len(reviews)
-        
-        # Map sensory levels to numeric values for calculation
-        sensory_level_map = {
-            "very_low": 1,
-            "low": 2,
-            "moderate": 3,
-            "high": 4,
-            "very_high": 5
-        }
-        
-        autism_rating = sum(
-            (r["staff_helpfulness"] + (6 - sensory_level_map.get(r["noise_level"], 3)) + 
-             (r["calm_areas_available"] and 5 or 1)) / 3 
-            for r in reviews
-        ) / len(reviews)
-        
-        await db.establishments.update_one(
-            {"id": establishment_id},
-            {
-                "$set": {
-                    "average_rating": round(avg_rating, 2),
-                    "autism_rating": round(autism_rating, 2)
-                }
-            }
-        )
+    await enqueue_review_totals([establishment_id])
     
     return {"message": "Review added successfully"}
 
 
 # Partners endpoints
 @api_router.get("/partners", response_model=List[Partner])
-async def get_partners():
+async def get_partners(request: Request):
     """Get all partners ordered by display_order"""
-    partners = await db.partners.find({"is_active": True}).sort("display_order", 1).to_list(1000)
-    return [Partner(**partner) for partner in partners]
+
+    async def render_partners() -> CompressedBody:
+        partners = await db.partners.find({"is_active": True}).sort("display_order", 1).to_list(1000)
+        rendered = render_documents(Partner, partners)
+        return CompressedBody(rendered.body, rendered.media_type)
+
+    partners = await partners_cache.get_or_compute(f"active:{response_format.get()}", render_partners)
+    return partners.response(request)
 
 
 @api_router.get("/partners/{partner_id}", response_model=Partner)
@@ -438,27 +3962,32 @@ async def get_partner(partner_id: str):
 @api_router.post("/partners", response_model=Partner)
 async def create_partner(partner: PartnerCreate):
     """Create a new partner"""
-    partner_dict = partner.dict()
+    partner_dict = partner.model_dump()
     partner_obj = Partner(**partner_dict)
-    await db.partners.insert_one(partner_obj.dict())
+    await db.partners.insert_one(partner_obj.model_dump())
+    partners_cache.invalidate()
+    await record_change("partner", partner_obj.id, ChangeOperation.CREATE, partner_obj.updated_at)
     return partner_obj
 
 
 @api_router.put("/partners/{partner_id}", response_model=Partner)
 async def update_partner(partner_id: str, partner_update: PartnerUpdate):
     """Update a partner"""
-    update_data = {k: v for k, v in partner_update.dict().items() if v is not None}
+    update_data = {k: v for k, v in partner_update.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
     
-    result = await db.partners.update_one(
+    updated_partner = await db.partners.find_one_and_update(
         {"id": partner_id}, 
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.matched_count == 0:
+    if updated_partner is None:
         raise HTTPException(status_code=404, detail="Partner not found")
+    partners_cache.invalidate()
+    await record_change("partner", partner_id, ChangeOperation.UPDATE, updated_partner["updated_at"])
     
-    updated_partner = await db.partners.find_one({"id": partner_id})
     return Partner(**updated_partner)
 
 
@@ -468,6 +3997,8 @@ async def delete_partner(partner_id: str):
     result = await db.partners.delete_one({"id": partner_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Partner not found")
+    partners_cache.invalidate()
+    await record_change("partner", partner_id, ChangeOperation.DELETE)
     return {"message": "Partner deleted successfully"}
 
 
@@ -496,7 +4027,9 @@ async def create_review(review_data: dict):
         )
         
         # Save to database
-        await db.reviews.insert_one(review.dict())
+        await db.reviews.insert_one(review.model_dump())
+        await adjust_review_counts({ReviewStatus.PENDING: 1})
+        await record_change("review", review.id, ChangeOperation.CREATE, review.created_at)
         return review
         
     except Exception as e:
@@ -516,48 +4049,157 @@ async def get_all_reviews(
         if establishment_id:
             query["establishment_id"] = establishment_id
             
-        reviews_data = await db.reviews.find(query).sort("created_at", -1).to_list(100)
-        
-        # Convert to Review models, removing MongoDB _id field
-        reviews = []
-        for review_data in reviews_data:
-            review_data.pop("_id", None)
-            reviews.append(Review(**review_data))
-            
-        return reviews
+        reviews_data = await db.reviews.find(query, REVIEW_PROJECTION).sort("created_at", -1).to_list(100)
+        return render_documents(Review, reviews_data)
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@api_router.post("/reviews/moderate")
+async def moderate_reviews(moderation: BulkReviewModeration):
+    """Approve or reject many reviews at once (admin only)"""
+    query: Dict[str, Any] = {}
+    if moderation.review_ids:
+        query["id"] = {"$in": moderation.review_ids}
+    if moderation.status:
+        query["status"] = moderation.status
+    if moderation.establishment_id:
+        query["establishment_id"] = moderation.establishment_id
+    if moderation.created_before:
+        query["created_at"] = {"$lt": to_naive_utc(moderation.created_before)}
+    if not query:
+        raise HTTPException(status_code=400, detail="Provide review_ids or at least one filter")
+
+    new_status = ReviewStatus.APPROVED if moderation.action == ReviewModerationAction.APPROVE else ReviewStatus.REJECTED
+    previous_reviews = await db.reviews.find(query, REVIEW_SCORE_PROJECTION).to_list(moderation.limit)
+    found_ids = {review["id"] for review in previous_reviews}
+
+    # One guarded update per previous status, so reviews changed concurrently are left alone.
+    # Each write is tagged with this call's moderation id; counters and rating deltas are
+    # derived only from the reviews that carry it, so overlapping moderations never both count.
+    now = datetime.utcnow()
+    moderation_id = str(uuid.uuid4())
+    by_status: Dict[str, List[str]] = {}
+    for review in previous_reviews:
+        if review.get("status") != new_status:
+            by_status.setdefault(review.get("status"), []).append(review["id"])
+    applied: List[Dict[str, Any]] = []
+    if by_status:
+        await db.reviews.bulk_write([
+            UpdateMany(
+                {"id": {"$in": review_ids}, "status": status},
+                {
+                    "$set": {"status": new_status.value, "approved_at": now, "approved_by": moderation.admin_user_id},
+                    "$push": {"moderation_ids": {"$each": [moderation_id], "$slice": -MODERATION_ID_HISTORY}},
+                }
+            )
+            for status, review_ids in by_status.items()
+        ], ordered=False)
+        applied_ids = {
+            review["id"] for review in await db.reviews.find(
+                {"id": {"$in": [review["id"] for review in previous_reviews]}, "moderation_ids": moderation_id},
+                {"_id": 0, "id": 1}
+            ).to_list(None)
+        }
+        applied = [review for review in previous_reviews if review["id"] in applied_ids and review.get("status") != new_status]
+    if applied:
+        count_changes: Dict[str, int] = {new_status.value: len(applied)}
+        for review in applied:
+            count_changes[review.get("status")] = count_changes.get(review.get("status"), 0) - 1
+        await adjust_review_counts(count_changes)
+        await record_changes("review", [(review["id"], ChangeOperation.UPDATE, now) for review in applied])
+
+    deltas = moderation_deltas(applied, new_status)
+    await enqueue_review_totals(deltas)
+    modified = len(applied)
+
+    return {
+        "action": moderation.action,
+        "matched": len(previous_reviews),
+        "modified": modified,
+        "unchanged": len(previous_reviews) - modified,
+        "not_found": [review_id for review_id in moderation.review_ids if review_id not in found_ids],
+        "establishments_updated": len([delta for delta in deltas.values() if delta["count"]]),
+    }
+
+
+@api_router.get("/reviews/queue", response_model=ReviewQueuePage)
+async def get_review_queue(
+    status: Optional[ReviewStatus] = None,
+    establishment_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=REVIEW_QUEUE_MAX_LIMIT)
+):
+    """Moderation queue, newest first, with cursor pagination and per-status counts (admin endpoint)"""
+    query: Dict[str, Any] = {}
+    if status:
+        query["status"] = status
+    if establishment_id:
+        query["establishment_id"] = establishment_id
+    if user_id:
+        query["user_id"] = user_id
+    if created_from or created_to:
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = to_naive_utc(created_from)
+        if created_to:
+            query["created_at"]["$lt"] = to_naive_utc(created_to)
+    if cursor:
+        position = decode_cursor(cursor, {"created_at": datetime, "id": str})
+        last_created_at = position["created_at"]
+        query["$or"] = [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": last_created_at, "id": {"$lt": position["id"]}},
+        ]
+
+    # Fetch one extra document to know whether another page exists
+    reviews_data, counts = await asyncio.gather(
+        db.reviews.find(query, REVIEW_PROJECTION).sort([("created_at", -1), ("id", -1)]).to_list(limit + 1),
+        get_review_counts(),
+    )
+    next_cursor = None
+    if len(reviews_data) > limit:
+        reviews_data = reviews_data[:limit]
+        last = reviews_data[-1]
+        next_cursor = encode_cursor({"created_at": last["created_at"], "id": last["id"]})
+
+    return ReviewQueuePage(
+        items=[Review(**review_data) for review_data in reviews_data],
+        next_cursor=next_cursor,
+        counts=counts,
+    )
+
+
 @api_router.put("/reviews/{review_id}/approve")
 async def approve_review(review_id: str, admin_user_id: str = "admin"):
     """Approve a review (admin only)"""
     try:
-        # Update review status
-        result = await db.reviews.update_one(
+        # Update review status; the previous document is needed for aggregate deltas
+        approval = {
+            "status": "approved",
+            "approved_at": datetime.utcnow(),
+            "approved_by": admin_user_id
+        }
+        previous = await db.reviews.find_one_and_update(
             {"id": review_id},
-            {
-                "$set": {
-                    "status": "approved",
-                    "approved_at": datetime.utcnow(),
-                    "approved_by": admin_user_id
-                }
-            }
+            {"$set": approval},
+            projection=REVIEW_PROJECTION
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Review not found")
+        await enqueue_review_totals(moderation_deltas([previous], ReviewStatus.APPROVED))
+        if previous.get("status") != ReviewStatus.APPROVED:
+            await adjust_review_counts({previous.get("status"): -1, ReviewStatus.APPROVED: 1})
+        await record_change("review", review_id, ChangeOperation.UPDATE, approval["approved_at"])
             
-        # Get updated review and convert to Review model
-        review_data = await db.reviews.find_one({"id": review_id})
-        if review_data:
-            # Remove MongoDB _id field to avoid serialization issues
-            review_data.pop("_id", None)
-            review = Review(**review_data)
-            return {"message": "Review approved successfully", "review": review.dict()}
-        else:
-            return {"message": "Review approved successfully"}
+        # The written document is the previous one with the approval applied
+        review = Review(**{**previous, **approval})
+        return {"message": "Review approved successfully", "review": review.model_dump()}
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -568,19 +4210,25 @@ async def reject_review(review_id: str):
     """Reject a review (admin only) - marks as rejected instead of deleting"""
     try:
         # Update review status to rejected instead of deleting
-        result = await db.reviews.update_one(
+        rejected_at = datetime.utcnow()
+        previous = await db.reviews.find_one_and_update(
             {"id": review_id},
             {
                 "$set": {
                     "status": "rejected",
-                    "approved_at": datetime.utcnow(),
+                    "approved_at": rejected_at,
                     "approved_by": "admin"
                 }
-            }
+            },
+            projection=REVIEW_SCORE_PROJECTION
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Review not found")
+        await enqueue_review_totals(moderation_deltas([previous], ReviewStatus.REJECTED))
+        if previous.get("status") != ReviewStatus.REJECTED:
+            await adjust_review_counts({previous.get("status"): -1, ReviewStatus.REJECTED: 1})
+        await record_change("review", review_id, ChangeOperation.UPDATE, rejected_at)
             
         return {"message": "Review rejected successfully"}
         
@@ -591,7 +4239,7 @@ async def reject_review(review_id: str):
 @api_router.get("/test-debug")
 async def test_debug():
     """Test endpoint to verify server is working"""
-    print("🧪 DEBUG: Test endpoint called!")
+    logger.debug("Test endpoint called")
     return {"message": "Server is working", "timestamp": datetime.utcnow()}
 
 
@@ -600,29 +4248,197 @@ async def test_debug():
 async def get_establishment_reviews_approved(establishment_id: str):
     """Get approved reviews for specific establishment (public endpoint)"""
     try:
-        print(f"🔍 DEBUG: Looking for reviews for establishment {establishment_id}")
-        
         # Get approved reviews for this establishment
         reviews_data = await db.reviews.find({
             "establishment_id": establishment_id,
             "status": "approved"
-        }).sort("created_at", -1).to_list(50)
-        
-        print(f"🔍 DEBUG: Found {len(reviews_data)} approved reviews")
-        
-        # Remove MongoDB _id field and return
-        for review in reviews_data:
-            review.pop("_id", None)
+        }, REVIEW_PROJECTION).sort("created_at", -1).to_list(50)
         
         return reviews_data
         
     except Exception as e:
-        print(f"❌ DEBUG: Exception in get_establishment_reviews_approved: {e}")
+        logger.exception("Failed to load approved reviews for establishment %s", establishment_id)
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# Export endpoints
+@api_router.get("/export/establishments")
+async def export_establishments(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    type: Optional[EstablishmentType] = None,
+    certified_only: bool = False,
+    municipality: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    include_images: bool = False
+):
+    """Stream establishments as NDJSON, CSV or Parquet straight from the cursor"""
+    filter_query: Dict[str, Any] = {}
+    if type:
+        filter_query["type"] = type
+    if certified_only:
+        filter_query["certified_autism_friendly"] = True
+    if municipality:
+        filter_query["municipality"] = municipality
+    if updated_since:
+        filter_query["updated_at"] = {"$gte": to_naive_utc(updated_since)}
+
+    columns = select_export_columns(ESTABLISHMENT_EXPORT_COLUMNS, fields)
+    if not include_images:
+        columns = [(column, kind) for column, kind in columns if column != "images"]
+        if not columns:
+            raise HTTPException(status_code=400, detail="images requires include_images=true")
+    cursor = db.establishments.find(filter_query, export_projection(columns)).batch_size(EXPORT_CHUNK_ROWS)
+    return export_response(cursor, format, columns, "establishments")
+
+
+@api_router.get("/export/reviews")
+async def export_reviews(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    status: Optional[ReviewStatus] = None,
+    establishment_id: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Stream moderated reviews as NDJSON, CSV or Parquet straight from the cursor"""
+    filter_query: Dict[str, Any] = {}
+    if status:
+        filter_query["status"] = status
+    if establishment_id:
+        filter_query["establishment_id"] = establishment_id
+
+    columns = select_export_columns(REVIEW_EXPORT_COLUMNS, fields)
+    cursor = db.reviews.find(filter_query, export_projection(columns)).batch_size(EXPORT_CHUNK_ROWS)
+    return export_response(cursor, format, columns, "reviews")
+
+
+# Offline snapshot endpoints
+@api_router.get("/snapshots/manifest")
+async def get_snapshot_manifest(request: Request):
+    """Version manifest of the latest offline catalogue snapshot"""
+    manifest = catalogue_snapshots.manifest
+    if manifest is None:
+        raise HTTPException(status_code=503, detail="Snapshot not built yet", headers={"Retry-After": str(SNAPSHOT_CHECK_SECONDS)})
+    headers = {"Cache-Control": "no-cache", "ETag": f'"{manifest["version"]}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return NegotiatedResponse(manifest, headers=headers)
+
+
+@api_router.get("/snapshots/{version}")
+async def get_snapshot(version: str, request: Request):
+    """Immutable offline catalogue snapshot of one version"""
+    response = catalogue_snapshots.response(
+        version, request, {"Cache-Control": SNAPSHOT_CACHE_CONTROL, "ETag": f'"{version}"'}
+    )
+    if response is None:
+        raise HTTPException(status_code=404, detail="Snapshot version not available")
+    return response
+
+
+# Change log endpoints
+@api_router.get("/changes")
+async def get_change_log(
+    after: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=CHANGE_LOG_MAX_PAGE),
+    entity: Optional[str] = None,
+    wait: float = Query(0, ge=0, le=CHANGE_LOG_MAX_WAIT_SECONDS)
+):
+    """Change events after a sequence number, optionally long-polling up to wait seconds for new ones"""
+    deadline = time.monotonic() + wait
+    while True:
+        appended = change_log_appended
+        events = await read_change_log(after, limit)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            break
+        # Woken by local appends; appends on other workers are seen on the next pass
+        try:
+            await asyncio.wait_for(appended.wait(), timeout=min(remaining, 1.0))
+        except asyncio.TimeoutError:
+            pass
+    last_seq = events[-1]["seq"] if events else after
+    if entity:
+        events = [event for event in events if event["entity"] == entity]
+    return {"events": events, "last_seq": last_seq}
+
+
+# Batch endpoint
+@api_router.post("/batch")
+async def batch_requests(batch: BatchRequest):
+    """Run several API requests concurrently in one round trip; results keep the request order"""
+    responses = await asyncio.gather(*(dispatch_subrequest(sub_request) for sub_request in batch.requests))
+    return {"responses": responses}
+
+
+# Admin endpoints
+@api_router.get("/admin/jobs")
+async def get_job_queue_metrics():
+    """Background job queue depth and outcome counters (admin only)"""
+    return job_queue.metrics()
+
+
+@api_router.get("/admin/slow-commands")
+async def get_slow_commands(limit: int = Query(50, ge=1, le=SLOW_COMMAND_BUFFER_SIZE)):
+    """Recent slow MongoDB commands with their route and query plan, plus per-command latency (admin only)"""
+    slow_commands, latency, failures = command_monitor.snapshot()
+    return {
+        "threshold_ms": SLOW_COMMAND_SECONDS * 1000,
+        "commands": slow_commands[::-1][:limit],
+        "stats": [
+            {
+                "collection": collection,
+                "command": command,
+                "count": histogram.count,
+                "failures": failures.get((collection, command), 0),
+                "mean_ms": round(histogram.total / histogram.count * 1000, 2),
+                **{f"p{round(q * 100)}_ms": round(histogram.quantile(q) * 1000, 2) for q in LATENCY_QUANTILES},
+            }
+            for (collection, command), histogram in sorted(latency.items(), key=lambda item: -item[1].total)
+        ],
+    }
+
+
+@api_router.get("/admin/summary")
+async def get_admin_summary():
+    """Counters, recent activity and pending work for the admin dashboard in one request"""
+    return await admin_summary_cache.get_or_compute("summary", compute_admin_summary)
+
+
+# Leaderboard endpoints
+@api_router.get("/leaderboards", response_model=List[Establishment])
+async def get_leaderboard(
+    type: Optional[EstablishmentType] = None,
+    municipality: Optional[str] = None,
+    certified_only: bool = False,
+    limit: int = Query(10, ge=1, le=LEADERBOARD_SIZE)
+):
+    """Top establishments by autism rating, optionally per type and municipality"""
+    top = leaderboards.top(
+        type.value if type else LEADERBOARD_ALL,
+        municipality or LEADERBOARD_ALL,
+        certified_only,
+        limit
+    )
+    if not top:
+        return []
+    ranking = {est_id: position for position, (est_id, _) in enumerate(top)}
+    establishments = await db.establishments.find({"id": {"$in": list(ranking)}}).to_list(len(ranking))
+    establishments.sort(key=lambda est: ranking[est["id"]])
+    return render_documents(Establishment, establishments)
+
+
 # Include the router in the main app
-app.include_router(api_router)
+app.include_router(api_router, default_response_class=NegotiatedResponse)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request and background job metrics in the Prometheus text format"""
+    lines = request_metrics.render() + job_queue_metric_lines() + command_metric_lines()
+    return Response(content="\n".join(lines) + "\n", media_type=PROMETHEUS_MEDIA_TYPE)
+
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -643,6 +4459,41 @@ logger = logging.getLogger(__name__)
 @app.on_event("startup")
 async def startup_db_client():
     """Initialize database with sample data"""
+    command_monitor.attach(asyncio.get_running_loop())
+    background_tasks.append(asyncio.create_task(explain_slow_commands()))
+    await db.establishments.create_index(
+        [("type", 1), ("event_end", 1), ("event_start", 1)],
+        partialFilterExpression={"type": EstablishmentType.EVENT.value},
+    )
+    await db.establishments.create_index(
+        IMPORT_KEY_FIELD,
+        unique=True,
+        partialFilterExpression={IMPORT_KEY_FIELD: {"$type": "string"}},
+    )
+    # Review queue sort order, unfiltered and filtered by status or by user
+    await db.reviews.create_index([("created_at", -1), ("id", -1)])
+    await db.reviews.create_index([("status", 1), ("created_at", -1), ("id", -1)])
+    await db.reviews.create_index([("user_id", 1), ("created_at", -1), ("id", -1)])
+    await db.establishments.create_index([("updated_at", 1), ("id", 1)])
+    await db.change_log.create_index("seq", unique=True)
+    await db.jobs.create_index([("status", 1), ("lease_until", 1)])
+    await db.change_log.create_index("at", expireAfterSeconds=CHANGE_LOG_RETENTION_DAYS * 24 * 3600)
+    await db.establishment_tombstones.create_index(
+        "deleted_at", expireAfterSeconds=TOMBSTONE_RETENTION_DAYS * 24 * 3600
+    )
+    await db.reviews.create_index([("establishment_id", 1), ("status", 1), ("created_at", -1)])
+    await initialize_review_counts()
+    await prepare_user_indexes()
+    await reconcile_review_totals()
+    await load_hours_index()
+    await load_events_index()
+    await load_coordinate_index()
+    await load_municipality_rollup()
+    await load_leaderboards()
+    background_tasks.append(asyncio.create_task(persist_leaderboards_periodically()))
+    background_tasks.append(asyncio.create_task(refresh_catalogue_snapshot_periodically()))
+    background_tasks.extend(job_queue.start())
+
     # Add sample partners if none exist
     existing_partners = await db.partners.count_documents({})
     if existing_partners == 0:
@@ -741,4 +4592,8 @@ async def startup_db_client():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await job_queue.drain(JOB_DRAIN_SECONDS)
+    for task in background_tasks:
+        task.cancel()
+    await persist_leaderboards()
     client.close()
\ No newline at end of file
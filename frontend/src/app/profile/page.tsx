@@ -81,7 +81,7 @@ export default function ProfilePage() {
       try {
         // For demo, we'll get the first user from the API
         // In a real app, this would be based on the authenticated user
-        const response = await fetch('/api/users')
+        const response = await fetch('/api/users?limit=1')
         if (response.ok) {
           const users = await response.json()
           if (users && users.length > 0) {
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+TEIA Serialization Benchmark
+Compares the per-item cost of rendering a 1k-establishment list response the
+old way (one model per document, then FastAPI's response_model pass) against
+the validated and trusted-document fast paths in server.render_documents, and
+the encode time and size of JSON against MessagePack for the same responses.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+# The benchmark never touches the database; the client is only constructed
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "teia_benchmark")
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+
+DOCUMENT_COUNT = 1000
+ROUNDS = 20
+
+
+def make_documents(count: int) -> List[dict]:
+    """Establishment documents shaped like the ones stored in MongoDB"""
+    now = datetime.utcnow()
+    return [
+        {
+            "_id": uuid.uuid4().hex[:24],
+            "id": str(uuid.uuid4()),
+            "name": f"Establishment {i}",
+            "type": "restaurant",
+            "description": "Quiet family restaurant with a calm room " * 3,
+            "address": "Rua da Praia, Faro",
+            "coordinates": {"lat": 37.0 + i / 10000, "lng": -7.9 - i / 10000},
+            "accessibility_features": ["quiet_spaces", "trained_staff"],
+            "certified_autism_friendly": i % 3 == 0,
+            "certification_date": None,
+            "contact_info": {"phone": "+351 289 000 000"},
+            "opening_hours": {"monday": "09:00-18:00", "tuesday": "09:00-18:00"},
+            "special_hours": ["Quiet hours: 09:00-11:00"],
+            "sensory_info": {"noise_level": "low"},
+            "reviews": [],
+            "average_rating": 4.2,
+            "autism_rating": 4.5,
+            "images": [],
+            "municipality": "Faro",
+            "created_at": now,
+            "updated_at": now,
+            "hours_index": {"open": [[540, 1080]], "quiet": [[540, 660]]},
+            "review_totals": {"count": 0, "rating_sum": 0, "autism_sum": 0},
+        }
+        for i in range(count)
+    ]
+
+
+def baseline(documents: List[dict]) -> bytes:
+    """The previous path: build models, then let FastAPI validate and encode them"""
+    field = create_response_field(name="response", type_=List[server.Establishment])
+    content = asyncio.run(serialize_response(
+        field=field,
+        response_content=[server.Establishment(**est) for est in documents],
+        is_coroutine=True,
+    ))
+    return server.ORJSONResponse(content).body
+
+
+def validated(documents: List[dict]) -> bytes:
+    server.TRUSTED_DB_DOCUMENTS = False
+    return server.render_documents(server.Establishment, documents).body
+
+
+def trusted(documents: List[dict]) -> bytes:
+    server.TRUSTED_DB_DOCUMENTS = True
+    return server.render_documents(server.Establishment, documents).body
+
+
+def as_msgpack(render):
+    def render_msgpack(documents: List[dict]) -> bytes:
+        token = server.response_format.set("msgpack")
+        try:
+            return render(documents)
+        finally:
+            server.response_format.reset(token)
+    return render_msgpack
+
+
+def measure(render, documents: List[dict]) -> float:
+    """Best per-item time in microseconds over ROUNDS renders"""
+    render(documents)
+    best = float("inf")
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        render(documents)
+        best = min(best, time.perf_counter() - started)
+    return best / len(documents) * 1_000_000
+
+
+def main():
+    documents = make_documents(DOCUMENT_COUNT)
+    results = [(name, measure(render, documents)) for name, render in (
+        ("baseline", baseline),
+        ("validated", validated),
+        ("trusted", trusted),
+    )]
+    reference = results[0][1]
+    print(f"Rendering {DOCUMENT_COUNT} establishments, best of {ROUNDS} rounds")
+    for name, per_item in results:
+        print(f"  {name:<10} {per_item:8.2f} us/item  {reference / per_item:5.1f}x")
+
+    if server.msgpack is None:
+        print("msgpack is not installed; skipping the format comparison")
+        return
+    print("JSON vs MessagePack")
+    for name, render in (("validated", validated), ("trusted", trusted)):
+        for label, encode in (("json", render), ("msgpack", as_msgpack(render))):
+            body = encode(documents)
+            print(f"  {name:<10} {label:<8} {measure(encode, documents):8.2f} us/item  {len(body) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+# The units under test never touch the database; the client is only constructed
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "teia_test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+import server
+from server import TimedCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return clock
+
+
+def constant(value, calls):
+    async def compute():
+        calls.append(value)
+        await asyncio.sleep(0)
+        return value
+    return compute
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = TimedCache(60)
+    calls = []
+
+    async def scenario():
+        return await asyncio.gather(*[cache.get_or_compute("k", constant("v", calls)) for _ in range(5)])
+
+    assert asyncio.run(scenario()) == ["v"] * 5
+    assert calls == ["v"]
+    assert cache._locks == {}
+
+
+def test_values_expire_after_the_ttl(clock):
+    cache = TimedCache(10)
+    calls = []
+    asyncio.run(cache.get_or_compute("k", constant("old", calls)))
+    clock.now += 9.9
+    assert asyncio.run(cache.get_or_compute("k", constant("new", calls))) == "old"
+    clock.now += 0.1
+    assert asyncio.run(cache.get_or_compute("k", constant("new", calls))) == "new"
+    assert calls == ["old", "new"]
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = TimedCache(60, max_entries=2)
+    calls = []
+    for key in ("a", "b"):
+        asyncio.run(cache.get_or_compute(key, constant(key, calls)))
+    asyncio.run(cache.get_or_compute("a", constant("a2", calls)))  # Hit: a is now most recent
+    asyncio.run(cache.get_or_compute("c", constant("c", calls)))
+
+    assert list(cache._values) == ["a", "c"]
+    assert calls == ["a", "b", "c"]
+
+
+def test_expired_entries_are_dropped_when_storing(clock):
+    cache = TimedCache(10, max_entries=5)
+    asyncio.run(cache.get_or_compute("stale", constant("s", [])))
+    clock.now += 11
+    asyncio.run(cache.get_or_compute("fresh", constant("f", [])))
+    assert list(cache._values) == ["fresh"]
+
+
+def test_failures_are_not_cached():
+    cache = TimedCache(60)
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_compute("k", failing))
+    assert asyncio.run(cache.get_or_compute("k", constant("v", []))) == "v"
+
+
+def test_invalidate_by_key_prefix_and_all():
+    cache = TimedCache(60)
+    for key in ("est:1:a", "est:1:b", "est:2:a"):
+        asyncio.run(cache.get_or_compute(key, constant(key, [])))
+
+    cache.invalidate_prefix("est:1:")
+    assert list(cache._values) == ["est:2:a"]
+    cache.invalidate("est:2:a")
+    assert not cache._values
+    asyncio.run(cache.get_or_compute("x", constant("x", [])))
+    cache.invalidate()
+    assert not cache._values
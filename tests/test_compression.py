@@ -0,0 +1,24 @@
+import server
+from server import negotiate_encoding, parse_quality_values
+
+
+def test_parse_quality_values():
+    assert parse_quality_values("gzip;q=0.5, BR, zstd;q=x") == {"gzip": 0.5, "br": 1.0, "zstd": 0.0}
+
+
+def test_negotiate_encoding_prefers_the_highest_q_value():
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+
+
+def test_negotiate_encoding_breaks_ties_by_server_preference():
+    supported = server.SUPPORTED_ENCODINGS
+    assert negotiate_encoding(", ".join(supported)) == supported[0]
+
+
+def test_negotiate_encoding_wildcard_and_refusals():
+    supported = server.SUPPORTED_ENCODINGS
+    assert negotiate_encoding("*") == supported[0]
+    assert negotiate_encoding(f"*, {supported[0]};q=0") == (supported[1] if len(supported) > 1 else None)
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("gzip;q=0") is None
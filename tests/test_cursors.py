@@ -0,0 +1,42 @@
+import base64
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, encode_cursor
+
+FIELDS = {"created_at": datetime, "id": str}
+
+
+def token(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def test_round_trip_restores_datetimes():
+    created_at = datetime(2026, 5, 1, 9, 30, 15, 123000)
+    cursor = encode_cursor({"created_at": created_at, "id": "r1"})
+    assert decode_cursor(cursor, FIELDS) == {"created_at": created_at, "id": "r1"}
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    token(b"not json"),
+    token(b"[1, 2]"),
+    token(b'{"id": "r1"}'),
+    token(b'{"created_at": "yesterday", "id": "r1"}'),
+    token(b'{"created_at": "2026-05-01T09:30:00", "id": 7}'),
+    token(b'{"created_at": 12, "id": "r1"}'),
+    "é",
+])
+def test_malformed_cursors_are_a_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, FIELDS)
+    assert error.value.status_code == 400
+    assert error.value.detail == "Invalid cursor"
+
+
+def test_custom_detail():
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(token(b"{}"), {"seq": int}, detail="Invalid since token")
+    assert error.value.detail == "Invalid since token"
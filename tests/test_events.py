@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from server import UpcomingEventsIndex, haversine_km
+
+NOW = datetime(2026, 6, 1, 12, 0)
+FARO = {"lat": 37.0194, "lng": -7.9322}
+
+
+def hours(count):
+    return NOW + timedelta(hours=count)
+
+
+def test_overlapping_is_ordered_by_start_and_includes_running_events():
+    index = UpcomingEventsIndex()
+    index.set("late", hours(10), hours(12), FARO)
+    index.set("running", hours(-2), hours(1), {})
+    index.set("soon", hours(2), hours(3), FARO)
+    index.set("past", hours(-5), hours(-4), FARO)
+
+    assert [key for key, _ in index.overlapping(NOW, hours(11))] == ["running", "soon", "late"]
+    assert [key for key, _ in index.overlapping(hours(4), hours(9))] == []
+    # Start and end are inclusive
+    assert [key for key, _ in index.overlapping(hours(3), hours(3))] == ["soon"]
+
+
+def test_set_replaces_and_remove_forgets():
+    index = UpcomingEventsIndex()
+    index.set("e", hours(1), hours(2), FARO)
+    index.set("e", hours(5), hours(6), None)
+
+    assert index.overlapping(NOW, hours(3)) == []
+    assert index.overlapping(NOW, hours(6)) == [("e", {})]
+    index.remove("e")
+    index.remove("missing")
+    assert len(index) == 0
+
+
+def test_prune_drops_ended_events_only():
+    index = UpcomingEventsIndex()
+    index.set("ended", hours(-3), hours(-1), FARO)
+    index.set("running", hours(-1), hours(1), FARO)
+    index.prune(NOW)
+
+    assert len(index) == 1
+    assert [key for key, _ in index.overlapping(hours(-10), hours(10))] == ["running"]
+
+
+def test_events_beyond_the_horizon_are_not_indexed():
+    index = UpcomingEventsIndex()
+    index.horizon = hours(24)
+    index.set("far", hours(48), hours(50), FARO)
+
+    assert len(index) == 0
+    assert index.covers(hours(24))
+    assert not index.covers(hours(25))
+    assert not UpcomingEventsIndex().covers(NOW)
+
+
+def test_haversine_distance_faro_to_lagos():
+    assert haversine_km(37.0194, -7.9322, 37.1028, -8.6730) == pytest.approx(66.4, abs=0.5)
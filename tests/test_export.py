@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from server import (
+    ESTABLISHMENT_EXPORT_COLUMNS,
+    IMPORT_LIST_SEPARATOR,
+    csv_cell,
+    export_projection,
+    select_export_columns,
+)
+
+
+def test_all_columns_without_a_field_list():
+    assert select_export_columns(ESTABLISHMENT_EXPORT_COLUMNS, None) == ESTABLISHMENT_EXPORT_COLUMNS
+
+
+def test_top_level_fields_select_their_nested_columns():
+    columns = select_export_columns(ESTABLISHMENT_EXPORT_COLUMNS, "name, coordinates")
+    assert columns == [("name", "str"), ("coordinates.lat", "float"), ("coordinates.lng", "float")]
+    assert export_projection(columns) == {"_id": 0, "name": 1, "coordinates": 1}
+
+
+def test_unknown_fields_are_rejected():
+    for fields in ("name,password_hash", "reviews", " , "):
+        with pytest.raises(HTTPException) as error:
+            select_export_columns(ESTABLISHMENT_EXPORT_COLUMNS, fields)
+        assert error.value.status_code == 400
+
+
+def test_csv_cells_by_kind():
+    assert csv_cell(None, "str") == ""
+    assert csv_cell(["a", "b"], "list") == f"a{IMPORT_LIST_SEPARATOR}b"
+    assert csv_cell({"noise_level": "baixo"}, "json") == '{"noise_level": "baixo"}'
+    assert csv_cell(datetime(2026, 5, 1, 9, 30), "datetime") == "2026-05-01T09:30:00"
+    assert csv_cell(4.5, "float") == 4.5
@@ -0,0 +1,23 @@
+import pytest
+
+import server
+from server import negotiate_format
+
+
+@pytest.mark.skipif(server.msgpack is None, reason="msgpack is not installed")
+def test_negotiate_format_msgpack():
+    assert negotiate_format("application/msgpack") == "msgpack"
+    assert negotiate_format("application/x-msgpack, application/json;q=0.5") == "msgpack"
+
+
+@pytest.mark.skipif(server.msgpack is None, reason="msgpack is not installed")
+def test_negotiate_format_json_wins_ties_only_when_preferred():
+    assert negotiate_format("application/json, application/msgpack;q=0.9") == "json"
+    assert negotiate_format("*/*") == "json"
+    assert negotiate_format("application/msgpack, */*") == "msgpack"
+    assert negotiate_format("") == "json"
+
+
+def test_negotiate_format_without_msgpack_is_json(monkeypatch):
+    monkeypatch.setattr(server, "msgpack", None)
+    assert negotiate_format("application/msgpack") == "json"
@@ -0,0 +1,111 @@
+from server import (
+    MINUTES_PER_DAY,
+    MINUTES_PER_WEEK,
+    WeeklyIntervalIndex,
+    parse_days,
+    parse_special_hours,
+    parse_time_ranges,
+)
+
+
+def test_parse_time_ranges_splits_multiple_ranges():
+    assert parse_time_ranges("09:00-13:00, 14:00-18:00") == [(540, 780), (840, 1080)]
+
+
+def test_parse_time_ranges_accepts_h_separator_and_en_dash():
+    assert parse_time_ranges("9h30–12h00") == [(570, 720)]
+
+
+def test_parse_time_ranges_all_day():
+    assert parse_time_ranges("24h") == [(0, MINUTES_PER_DAY)]
+    assert parse_time_ranges("00:00 - 24:00") == [(0, MINUTES_PER_DAY)]
+
+
+def test_parse_time_ranges_overnight_continues_into_next_day():
+    assert parse_time_ranges("20:00-08:00") == [(1200, MINUTES_PER_DAY + 480)]
+
+
+def test_parse_time_ranges_ignores_invalid_and_empty_text():
+    assert parse_time_ranges("25:00-26:00") == []
+    assert parse_time_ranges("Closed") == []
+    assert parse_time_ranges(None) == []
+
+
+def test_parse_special_hours_named_day_applies_to_that_day_only():
+    tuesday = MINUTES_PER_DAY
+    assert parse_special_hours(["Terça-feira 09:00-11:00"]) == [[tuesday + 540, tuesday + 660]]
+
+
+def test_parse_special_hours_without_day_applies_every_day():
+    intervals = parse_special_hours(["Quiet hours: 09:00-10:00"])
+    assert intervals == [[day * MINUTES_PER_DAY + 540, day * MINUTES_PER_DAY + 600] for day in range(7)]
+
+
+def test_parse_special_hours_wraps_sunday_night_into_monday_and_merges():
+    intervals = parse_special_hours(["Sunday 22:00-02:00", "Monday 01:00-03:00"])
+    assert intervals == [[0, 180], [6 * MINUTES_PER_DAY + 1320, MINUTES_PER_WEEK]]
+
+
+def test_parse_days_ranges_lists_and_groups():
+    assert parse_days("Segunda a Sexta 09:00-11:00") == {0, 1, 2, 3, 4}
+    assert parse_days("Mon-Fri 9:00-10:00") == {0, 1, 2, 3, 4}
+    assert parse_days("Sat to Mon") == {5, 6, 0}
+    assert parse_days("Terças e Quintas 15:00-16:00") == {1, 3}
+    assert parse_days("Sex e Sáb 10:00-12:00") == {4, 5}
+    assert parse_days("Weekends 08:00-10:00") == {5, 6}
+    assert parse_days("Dias úteis 08:00-10:00") == {0, 1, 2, 3, 4}
+
+
+def test_parse_days_ignores_names_that_are_not_days():
+    assert parse_days("Quinta do Lago quiet room 10:00-12:00") == set()
+    assert parse_days("Dom Pedro lounge 10:00-11:00") == set()
+    assert parse_days("Sun terrace 10:00-12:00") == set()
+    assert parse_days("Dom. 10:00-11:00") == {6}
+
+
+def test_parse_special_hours_day_range_applies_to_each_day():
+    intervals = parse_special_hours(["Segunda a Sexta 09:00-11:00"])
+    assert intervals == [[day * MINUTES_PER_DAY + 540, day * MINUTES_PER_DAY + 660] for day in range(5)]
+
+
+def test_parse_special_hours_leaves_out_dated_and_nth_weekday_entries():
+    assert parse_special_hours([
+        "Feriados 10:00-12:00",
+        "Primeiro sábado do mês 10:00-12:00",
+        "25/12 09:00-10:00",
+    ]) == []
+
+
+def test_parse_special_hours_skips_entries_without_times():
+    assert parse_special_hours(["Sensory-friendly on request", ""]) == []
+
+
+def test_weekly_interval_index_at():
+    index = WeeklyIntervalIndex()
+    index.set("cafe", [[540, 1080]])
+    index.set("bar", [[1200, 1500]])
+
+    assert index.at(540) == {"cafe"}
+    assert index.at(1079) == {"cafe"}
+    assert index.at(1080) == set()
+    assert index.at(1440) == {"bar"}
+    assert index.at(1499) == {"bar"}
+    assert len(index) == 2
+
+
+def test_weekly_interval_index_set_replaces_and_remove_forgets():
+    index = WeeklyIntervalIndex()
+    index.set("cafe", [[540, 600]])
+    index.set("cafe", [[700, 800]])
+    assert index.at(550) == set()
+    assert index.at(750) == {"cafe"}
+
+    index.remove("cafe")
+    assert index.at(750) == set()
+    assert len(index) == 0
+
+
+def test_weekly_interval_index_ignores_empty_intervals():
+    index = WeeklyIntervalIndex()
+    index.set("closed", [])
+    assert len(index) == 0
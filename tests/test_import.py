@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime
+
+from pymongo import InsertOne, UpdateOne
+
+from server import build_import_operation, csv_row_to_establishment, iter_csv_records, prepare_import_row
+
+NOW = datetime(2026, 10, 19, 12, 0)
+MINIMAL_ROW = {
+    "name": "Hotel Calmo", "type": "hotel", "description": "Quiet rooms", "address": "Faro",
+    "coordinates": {"lat": 37.02, "lng": -7.93},
+}
+
+
+async def lines_of(text):
+    for line in text.split("\n"):
+        yield line
+
+
+def records(text):
+    async def collect():
+        return [record async for record in iter_csv_records(lines_of(text))]
+    return asyncio.run(collect())
+
+
+def test_iter_csv_records_joins_quoted_newlines_and_numbers_rows_by_first_line():
+    text = 'name,description\nA,"line one\nline ""two"""\n\nB,plain\n'
+    assert records(text) == [
+        (1, ["name", "description"]),
+        (2, ["A", 'line one\nline "two"']),
+        (5, ["B", "plain"]),
+    ]
+
+
+def test_iter_csv_records_reports_an_unterminated_quote():
+    result = records('name,description\nA,"never closed\nB,x')
+    assert result[0] == (1, ["name", "description"])
+    row_number, error = result[1]
+    assert row_number == 2 and isinstance(error, ValueError)
+
+
+def test_csv_row_to_establishment_nests_splits_and_decodes():
+    header = ["name", "lat", "lng", "opening_hours.monday", "accessibility_features", "sensory_info", "images"]
+    values = ["A", "37.0", "-8.0", "09:00-18:00", "quiet_spaces| trained_staff |", '{"noise_level": "low"}', ""]
+    assert csv_row_to_establishment(header, values) == {
+        "name": "A",
+        "coordinates": {"lat": "37.0", "lng": "-8.0"},
+        "opening_hours": {"monday": "09:00-18:00"},
+        "accessibility_features": ["quiet_spaces", "trained_staff"],
+        "sensory_info": {"noise_level": "low"},
+    }
+
+
+def test_row_without_external_id_is_a_full_insert():
+    document, fields = prepare_import_row(dict(MINIMAL_ROW))
+    operation = build_import_operation(document, fields, NOW)
+    assert isinstance(operation, InsertOne)
+    assert operation._doc["updated_at"] == NOW
+    assert operation._doc["images"] == []
+
+
+def test_partial_row_upsert_sets_only_supplied_columns():
+    document, fields = prepare_import_row(dict(MINIMAL_ROW, external_id="p-1", opening_hours={"monday": "24h"}))
+    operation = build_import_operation(document, fields, NOW)
+
+    assert isinstance(operation, UpdateOne)
+    update = operation._doc
+    assert set(update["$set"]) == {
+        "name", "type", "description", "address", "coordinates", "opening_hours", "municipality", "updated_at",
+    }
+    # Omitted columns only apply when the upsert inserts a new venue
+    for field in ("images", "special_hours", "sensory_info", "contact_info", "hours_index", "review_totals"):
+        assert field in update["$setOnInsert"]
+    assert operation._filter == {"external_id": "p-1"}
+
+
+def test_upsert_with_both_hour_columns_sets_the_hours_index():
+    row = dict(MINIMAL_ROW, external_id="p-1", opening_hours={"monday": "24h"}, special_hours=["09:00-10:00"])
+    document, fields = prepare_import_row(row)
+    assert "hours_index" in build_import_operation(document, fields, NOW)._doc["$set"]
+
+
+def test_defaulted_event_end_is_imported_with_the_start():
+    row = dict(MINIMAL_ROW, type="event", external_id="e-1", event_start="2026-11-01T10:00:00")
+    document, fields = prepare_import_row(row)
+    update = build_import_operation(document, fields, NOW)._doc
+    assert update["$set"]["event_end"] == update["$set"]["event_start"]
@@ -0,0 +1,110 @@
+import time
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from server import (
+    ITINERARY_MAX_CANDIDATES,
+    CoordinateIndex,
+    ItineraryRequest,
+    plan_route,
+    route_distance,
+    schedule_route,
+)
+
+OPEN_ALL_WEEK = [[0, 7 * 24 * 60]]
+MONDAY_10AM = 10 * 60
+
+
+def line_distances(positions):
+    """Matrix and origin distances for stops on a line, with the origin at 0 km"""
+    positions = np.array(positions, dtype=float)
+    return np.abs(positions[:, None] - positions[None, :]), np.abs(positions)
+
+
+def test_plan_route_visits_nearest_first():
+    matrix, from_origin = line_distances([3.0, 1.0, 2.0])
+    request = ItineraryRequest(start={"lat": 0, "lng": 0})
+    order = plan_route(matrix, from_origin, [OPEN_ALL_WEEK] * 3, MONDAY_10AM, request)
+    assert order == [1, 2, 0]
+    assert route_distance(order, matrix, from_origin) == 3.0
+
+
+def test_plan_route_respects_max_stops():
+    matrix, from_origin = line_distances([1.0, 2.0, 3.0, 4.0])
+    request = ItineraryRequest(start={"lat": 0, "lng": 0}, max_stops=2)
+    assert plan_route(matrix, from_origin, [OPEN_ALL_WEEK] * 4, MONDAY_10AM, request) == [0, 1]
+
+
+def test_plan_route_skips_venues_that_are_closed_during_the_visit():
+    matrix, from_origin = line_distances([1.0, 2.0])
+    closed_until_evening = [[18 * 60, 20 * 60]]
+    request = ItineraryRequest(start={"lat": 0, "lng": 0})
+    order = plan_route(matrix, from_origin, [closed_until_evening, OPEN_ALL_WEEK], MONDAY_10AM, request)
+    assert order == [1]
+
+
+def test_schedule_route_waits_for_opening_within_the_limit():
+    matrix, from_origin = line_distances([30.0])
+    request = ItineraryRequest(start={"lat": 0, "lng": 0}, travel_speed_kmh=30.0, visit_minutes=60)
+    schedule = schedule_route([0], matrix, from_origin, [[[11 * 60 + 30, 18 * 60]]], MONDAY_10AM, request)
+    # Arrives at 11:00 after an hour on the road, starts the visit when it opens at 11:30
+    assert schedule == [(0, 11 * 60 + 30, 30.0)]
+
+
+def test_plan_route_leaves_no_improving_reversal():
+    rng = np.random.default_rng(3)
+    points = rng.random((12, 2)) * 10
+    matrix = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=-1)
+    from_origin = np.linalg.norm(points, axis=-1)
+    request = ItineraryRequest(start={"lat": 0, "lng": 0})
+
+    order = plan_route(matrix, from_origin, [OPEN_ALL_WEEK] * 12, MONDAY_10AM, request)
+    distance = route_distance(order, matrix, from_origin)
+
+    assert sorted(order) == list(range(12))
+    for i in range(len(order) - 1):
+        for j in range(i + 2, len(order) + 1):
+            reversed_order = order[:i] + order[i:j][::-1] + order[j:]
+            assert route_distance(reversed_order, matrix, from_origin) >= distance - 1e-9
+
+
+def test_plan_route_for_200_candidates_stays_under_100ms():
+    rng = np.random.default_rng(7)
+    index = CoordinateIndex()
+    keys = [f"venue-{i}" for i in range(200)]
+    for key in keys:
+        index.set(key, {"lat": 37.0 + rng.random() * 0.3, "lng": -8.0 + rng.random() * 0.3})
+    request = ItineraryRequest(start={"lat": 37.15, "lng": -7.85})
+
+    started = time.perf_counter()
+    known, matrix, from_origin = index.submatrix(keys, (37.15, -7.85))
+    order = plan_route(matrix, from_origin, [OPEN_ALL_WEEK] * len(known), MONDAY_10AM, request)
+    elapsed = time.perf_counter() - started
+
+    assert len(order) == request.max_stops
+    assert elapsed < 0.1
+
+
+def test_coordinate_index_nearest_and_removal():
+    index = CoordinateIndex()
+    for key, lat in (("a", 37.00), ("b", 37.01), ("c", 37.05), ("d", 38.0)):
+        index.set(key, {"lat": lat, "lng": -8.0})
+
+    nearest = index.nearest("a", limit=5, max_km=10)
+    assert [key for key, _ in nearest] == ["b", "c"]
+    assert round(nearest[0][1], 2) == 1.11
+    assert index.nearest_to((37.04, -8.0), ["a", "b", "c", "d", "missing"], 2) == ["c", "b"]
+
+    index.remove("b")
+    index.set("c", {})
+    assert len(index) == 2
+    assert [key for key, _ in index.nearest("a", limit=5, max_km=200)] == ["d"]
+
+
+def test_request_caps_the_number_of_establishment_ids():
+    ids = [f"e{index}" for index in range(ITINERARY_MAX_CANDIDATES)]
+    assert len(ItineraryRequest(start={"lat": 0, "lng": 0}, establishment_ids=ids).establishment_ids) == len(ids)
+    with pytest.raises(ValidationError):
+        ItineraryRequest(start={"lat": 0, "lng": 0}, establishment_ids=ids + ["one-too-many"])
@@ -0,0 +1,119 @@
+import asyncio
+
+import server
+from server import JobQueue
+
+
+def run_queue(scenario, workers=2, max_attempts=3):
+    queue = JobQueue(workers, max_attempts, persist=False)
+
+    async def main():
+        tasks = queue.start()
+        try:
+            await scenario(queue)
+            await queue.drain(timeout=2)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    asyncio.run(main())
+    return queue
+
+
+def test_debounced_jobs_merge_payloads_and_run_once():
+    calls = []
+
+    async def handler(key, payload):
+        calls.append((key, payload))
+
+    async def scenario(queue):
+        queue.register("sum", handler, lambda pending, new: pending + new)
+        await queue.enqueue("sum", "a", 1, delay=0.05)
+        await queue.enqueue("sum", "a", 2)
+        await queue.enqueue("sum", "b", 5)
+
+    queue = run_queue(scenario)
+    assert sorted(calls) == [("a", 3), ("b", 5)]
+    assert queue.counts["debounced"] == 1
+    assert queue.counts["succeeded"] == 2
+
+
+def test_failed_jobs_are_retried_until_they_succeed(monkeypatch):
+    monkeypatch.setattr(server, "JOB_RETRY_BASE_SECONDS", 0.01)
+    attempts = []
+
+    async def handler(key, payload):
+        attempts.append(key)
+        if len(attempts) < 3:
+            raise RuntimeError("boom")
+
+    async def scenario(queue):
+        queue.register("flaky", handler)
+        await queue.enqueue("flaky", "k", None)
+
+    queue = run_queue(scenario)
+    assert attempts == ["k", "k", "k"]
+    assert queue.counts["retried"] == 2
+    assert queue.counts["succeeded"] == 1
+
+
+def test_jobs_failing_every_attempt_are_dropped(monkeypatch):
+    monkeypatch.setattr(server, "JOB_RETRY_BASE_SECONDS", 0.01)
+
+    async def handler(key, payload):
+        raise RuntimeError("boom")
+
+    async def scenario(queue):
+        queue.register("broken", handler)
+        await queue.enqueue("broken", "k", None)
+
+    queue = run_queue(scenario, max_attempts=2)
+    assert queue.counts["failed"] == 1
+    assert queue.metrics()["pending"] == 0
+
+
+def test_worker_survives_errors_in_queue_bookkeeping():
+    ran = []
+
+    async def failing(key, payload):
+        raise RuntimeError("boom")
+
+    async def handler(key, payload):
+        ran.append(key)
+
+    async def broken_retry(job):
+        raise RuntimeError("bookkeeping")
+
+    async def scenario(queue):
+        queue._retry_or_fail = broken_retry
+        queue.register("failing", failing)
+        queue.register("ok", handler)
+        await queue.enqueue("failing", "k", None)
+        await asyncio.sleep(0.05)
+        await queue.enqueue("ok", "k", None)
+
+    queue = run_queue(scenario, workers=1)
+    assert ran == ["k"]
+    assert queue.in_flight == 0
+
+
+def test_jobs_with_the_same_key_never_overlap():
+    running = []
+    overlaps = []
+
+    async def handler(key, payload):
+        if key in running:
+            overlaps.append(key)
+        running.append(key)
+        await asyncio.sleep(0.05)
+        running.remove(key)
+
+    async def scenario(queue):
+        queue.register("slow", handler)
+        await queue.enqueue("slow", "a", None)
+        await asyncio.sleep(0.01)
+        await queue.enqueue("slow", "a", None)
+
+    queue = run_queue(scenario, workers=4)
+    assert overlaps == []
+    assert queue.counts["succeeded"] == 2
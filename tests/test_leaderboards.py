@@ -0,0 +1,60 @@
+from server import LEADERBOARD_ALL, LEADERBOARD_SIZE, Leaderboards
+
+
+def establishment(est_id, rating, est_type="restaurant", municipality="Faro", certified=False):
+    return {"id": est_id, "type": est_type, "municipality": municipality,
+            "certified_autism_friendly": certified, "autism_rating": rating}
+
+
+def test_boards_rank_by_rating_with_id_as_tie_break():
+    boards = Leaderboards()
+    boards.set(establishment("b", 4.0))
+    boards.set(establishment("a", 4.0))
+    boards.set(establishment("c", 4.5))
+
+    assert boards.top("restaurant", "Faro", False, 10) == [("c", 4.5), ("a", 4.0), ("b", 4.0)]
+    assert boards.top("restaurant", "Faro", False, 2) == [("c", 4.5), ("a", 4.0)]
+
+
+def test_establishments_appear_in_type_municipality_and_certified_variants():
+    boards = Leaderboards()
+    boards.set(establishment("cafe", 3.0, certified=True))
+    boards.set(establishment("hotel", 4.0, est_type="hotel", municipality=None))
+
+    assert boards.top(LEADERBOARD_ALL, LEADERBOARD_ALL, False, 10) == [("hotel", 4.0), ("cafe", 3.0)]
+    assert boards.top(LEADERBOARD_ALL, "Faro", True, 10) == [("cafe", 3.0)]
+    assert boards.top("hotel", LEADERBOARD_ALL, False, 10) == [("hotel", 4.0)]
+    assert boards.top("hotel", "Faro", False, 10) == []
+    assert boards.top("hotel", LEADERBOARD_ALL, True, 10) == []
+
+
+def test_set_moves_and_remove_drops_entries():
+    boards = Leaderboards()
+    boards.set(establishment("a", 2.0))
+    boards.set(establishment("b", 3.0))
+    boards.set(establishment("a", 5.0, municipality="Lagos"))
+
+    assert boards.top("restaurant", "Faro", False, 10) == [("b", 3.0)]
+    assert boards.top("restaurant", LEADERBOARD_ALL, False, 10) == [("a", 5.0), ("b", 3.0)]
+    boards.remove("b")
+    boards.remove("unknown")
+    assert boards.top("restaurant", LEADERBOARD_ALL, False, 10) == [("a", 5.0)]
+
+
+def test_only_changes_within_the_top_mark_boards_dirty():
+    boards = Leaderboards()
+    for index in range(LEADERBOARD_SIZE):
+        boards.set(establishment(f"top{index}", 5.0))
+    changed = boards.drain_dirty()
+    assert len(changed[("restaurant", "Faro", False)]) == LEADERBOARD_SIZE
+    assert boards.drain_dirty() == {}
+
+    boards.set(establishment("low", 1.0))
+    assert boards.drain_dirty() == {}
+    boards.set(establishment("high", 4.9, certified=True))
+    assert ("restaurant", "Faro", False) not in boards.drain_dirty()
+    # Ties rank by id, so this lands just outside the top of the shared boards
+    boards.set(establishment("zbest", 5.0, municipality="Lagos"))
+    assert set(boards.drain_dirty()) == {
+        ("restaurant", "Lagos", False), (LEADERBOARD_ALL, "Lagos", False),
+    }
@@ -0,0 +1,44 @@
+import pytest
+
+from server import LATENCY_BUCKETS, LatencyHistogram
+
+
+def test_quantile_of_an_empty_histogram_is_zero():
+    assert LatencyHistogram(LATENCY_BUCKETS).quantile(0.5) == 0.0
+
+
+def test_quantile_interpolates_inside_the_bucket():
+    histogram = LatencyHistogram((0.1, 0.2, 0.4))
+    for value in (0.05, 0.15, 0.15, 0.3):
+        histogram.observe(value)
+
+    assert histogram.quantile(0.25) == pytest.approx(0.1)
+    # Ranks 1..2 of the 0.1-0.2 bucket hold two observations
+    assert histogram.quantile(0.5) == pytest.approx(0.15)
+    assert histogram.quantile(1.0) == pytest.approx(0.4)
+
+
+def test_quantile_in_the_overflow_bucket_is_the_largest_bound():
+    histogram = LatencyHistogram((0.1, 0.2))
+    histogram.observe(5.0)
+    assert histogram.quantile(0.99) == 0.2
+
+
+def test_values_on_a_bound_count_in_that_bucket():
+    histogram = LatencyHistogram((0.1, 0.2))
+    histogram.observe(0.1)
+    assert histogram.counts == [1, 0, 0]
+
+
+def test_render_is_cumulative_prometheus_text():
+    histogram = LatencyHistogram((0.1, 0.2))
+    for value in (0.05, 0.15, 0.5):
+        histogram.observe(value)
+
+    assert histogram.render("request_seconds", 'route="/x"') == [
+        'request_seconds_bucket{route="/x",le="0.1"} 1',
+        'request_seconds_bucket{route="/x",le="0.2"} 2',
+        'request_seconds_bucket{route="/x",le="+Inf"} 3',
+        'request_seconds_sum{route="/x"} 0.7',
+        'request_seconds_count{route="/x"} 3',
+    ]
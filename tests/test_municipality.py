@@ -0,0 +1,72 @@
+import json
+
+from server import MunicipalityLocator, MunicipalityRollup
+
+
+def square(min_lng, min_lat, size):
+    return [[min_lng, min_lat], [min_lng + size, min_lat], [min_lng + size, min_lat + size],
+            [min_lng, min_lat + size], [min_lng, min_lat]]
+
+
+def write_boundaries(tmp_path, features):
+    path = tmp_path / "municipalities.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {"name": name}, "geometry": geometry} for name, geometry in features
+    ]}), encoding="utf-8")
+    return path
+
+
+def test_locate_finds_polygons_and_respects_holes(tmp_path):
+    locator = MunicipalityLocator()
+    locator.load(write_boundaries(tmp_path, [
+        ("Faro", {"type": "Polygon", "coordinates": [square(-8.0, 37.0, 0.2), square(-7.95, 37.05, 0.05)]}),
+        ("Inner", {"type": "Polygon", "coordinates": [square(-7.95, 37.05, 0.05)]}),
+    ]))
+
+    assert len(locator) == 2
+    assert locator.locate({"lat": 37.15, "lng": -7.85}) == "Faro"
+    assert locator.locate({"lat": 37.07, "lng": -7.93}) == "Inner"
+    assert locator.locate({"lat": 38.0, "lng": -7.85}) is None
+
+
+def test_locate_checks_every_part_of_a_multipolygon(tmp_path):
+    locator = MunicipalityLocator()
+    locator.load(write_boundaries(tmp_path, [
+        ("Split", {"type": "MultiPolygon", "coordinates": [[square(-9.0, 37.0, 0.1)], [square(-8.0, 37.0, 0.1)]]}),
+    ]))
+
+    assert locator.locate({"lat": 37.05, "lng": -8.95}) == "Split"
+    assert locator.locate({"lat": 37.05, "lng": -7.95}) == "Split"
+    assert locator.locate({"lat": 37.05, "lng": -8.5}) is None
+
+
+def test_locate_without_coordinates_or_boundaries():
+    locator = MunicipalityLocator()
+    assert not locator
+    assert locator.locate({"lat": 37.0, "lng": -8.0}) is None
+    assert locator.locate({}) is None
+
+
+def test_rollup_totals_follow_updates_and_removals():
+    rollup = MunicipalityRollup()
+    rollup.set({"id": "a", "municipality": "Faro", "certified_autism_friendly": True, "autism_rating": 4.0}, 3)
+    rollup.set({"id": "b", "municipality": "Faro", "autism_rating": 0.0}, 1)
+    rollup.set({"id": "c", "municipality": "Lagos", "autism_rating": 2.0}, 0)
+    rollup.set({"id": "d", "municipality": None, "autism_rating": 5.0}, 9)
+
+    assert rollup.stats() == [
+        {"municipality": "Faro", "establishments": 2, "certified_establishments": 1,
+         "average_autism_rating": 4.0, "review_count": 4},
+        {"municipality": "Lagos", "establishments": 1, "certified_establishments": 0,
+         "average_autism_rating": 2.0, "review_count": 0},
+    ]
+
+    # Moving municipality without a count keeps the tracked review count
+    rollup.set({"id": "b", "municipality": "Lagos", "autism_rating": 3.0})
+    rollup.remove("c")
+    assert rollup.stats() == [
+        {"municipality": "Faro", "establishments": 1, "certified_establishments": 1,
+         "average_autism_rating": 4.0, "review_count": 3},
+        {"municipality": "Lagos", "establishments": 1, "certified_establishments": 0,
+         "average_autism_rating": 3.0, "review_count": 1},
+    ]
@@ -0,0 +1,151 @@
+import pytest
+from fastapi import HTTPException
+
+from server import PATCH_ARRAY_SLICE_MAX, compile_json_patch, compile_merge_patch
+
+
+def test_replace_nested_field_is_a_literal_set():
+    compiler = compile_json_patch([{"op": "replace", "path": "/opening_hours/monday", "value": "10:00-18:00"}])
+    assert compiler.stages == [{"$set": {"opening_hours.monday": {"$literal": "10:00-18:00"}}}]
+    assert compiler.touched_fields == {"opening_hours"}
+    assert compiler.filter("e1") == {"id": "e1"}
+
+
+def test_test_operations_become_filter_conditions():
+    compiler = compile_json_patch([
+        {"op": "test", "path": "/name", "value": "Hotel"},
+        {"op": "replace", "path": "/name", "value": "Hotel Calmo"},
+    ])
+    assert compiler.filter("e1") == {"id": "e1", "$expr": {"$eq": ["$name", {"$literal": "Hotel"}]}}
+
+
+def test_several_tests_and_array_indexes_compare_exactly():
+    compiler = compile_json_patch([
+        {"op": "test", "path": "/opening_hours/monday", "value": "09:00-17:00"},
+        {"op": "test", "path": "/images/1", "value": "b.jpg"},
+    ])
+    assert compiler.filter("e1") == {"id": "e1", "$expr": {"$and": [
+        {"$eq": ["$opening_hours.monday", {"$literal": "09:00-17:00"}]},
+        {"$eq": [{"$arrayElemAt": ["$images", 1]}, {"$literal": "b.jpg"}]},
+    ]}}
+
+
+def test_test_of_the_end_marker_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        compile_json_patch([{"op": "test", "path": "/images/-", "value": "a.jpg"}])
+    assert error.value.status_code == 400
+
+
+def test_test_after_a_change_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        compile_json_patch([
+            {"op": "replace", "path": "/name", "value": "Hotel Calmo"},
+            {"op": "test", "path": "/name", "value": "Hotel"},
+        ])
+    assert error.value.status_code == 400
+
+
+def test_append_needs_no_length_condition():
+    compiler = compile_json_patch([{"op": "add", "path": "/images/-", "value": "a.jpg"}])
+    assert compiler.stages == [{"$set": {"images": {"$concatArrays": [
+        {"$ifNull": ["$images", []]}, {"$literal": ["a.jpg"]}, {"$literal": []},
+    ]}}}]
+    assert compiler.filter("e1") == {"id": "e1"}
+
+
+def test_remove_by_index_is_one_stage_and_requires_the_index():
+    compiler = compile_json_patch([{"op": "remove", "path": "/images/1"}])
+    assert compiler.stages == [{"$set": {"images": {"$concatArrays": [
+        {"$slice": [{"$ifNull": ["$images", []]}, 0, 1]},
+        {"$slice": [{"$ifNull": ["$images", []]}, 2, PATCH_ARRAY_SLICE_MAX]},
+    ]}}}]
+    assert compiler.filter("e1") == {"id": "e1", "$and": [{"images.1": {"$exists": True}}]}
+
+
+def test_insert_at_index_allows_the_end_of_the_array():
+    compiler = compile_json_patch([{"op": "add", "path": "/images/2", "value": "c.jpg"}])
+    assert compiler.filter("e1") == {"id": "e1", "$and": [{"images.1": {"$exists": True}}]}
+
+
+def test_insert_at_zero_needs_no_length_condition():
+    compiler = compile_json_patch([{"op": "add", "path": "/images/0", "value": "a.jpg"}])
+    assert compiler.filter("e1") == {"id": "e1"}
+
+
+def test_length_conditions_account_for_earlier_operations():
+    compiler = compile_json_patch([
+        {"op": "add", "path": "/images/-", "value": "d.jpg"},
+        {"op": "replace", "path": "/images/3", "value": "D.jpg"},
+        {"op": "remove", "path": "/images/0"},
+    ])
+    # After the append, index 3 exists when the stored array has 3 items
+    assert compiler.filter("e1") == {"id": "e1", "$and": [{"images.2": {"$exists": True}}]}
+
+
+def test_index_past_an_array_set_by_the_patch_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        compile_json_patch([
+            {"op": "replace", "path": "/images", "value": ["a.jpg"]},
+            {"op": "replace", "path": "/images/1", "value": "b.jpg"},
+        ])
+    assert error.value.status_code == 400
+
+
+def test_replace_or_remove_past_the_end_marker_is_rejected():
+    for operation in ({"op": "replace", "path": "/images/-", "value": "a.jpg"}, {"op": "remove", "path": "/images/-"}):
+        with pytest.raises(HTTPException) as error:
+            compile_json_patch([operation])
+        assert error.value.status_code == 400
+
+
+def test_overlapping_paths_go_to_separate_stages():
+    compiler = compile_json_patch([
+        {"op": "add", "path": "/images/-", "value": "a.jpg"},
+        {"op": "remove", "path": "/images/0"},
+    ])
+    assert len(compiler.stages) == 2
+
+
+def test_values_are_validated_against_the_model():
+    with pytest.raises(HTTPException) as error:
+        compile_json_patch([{"op": "replace", "path": "/images/0", "value": 5}])
+    assert error.value.status_code == 422
+
+
+def test_unpatchable_fields_and_unsupported_operations():
+    with pytest.raises(HTTPException) as error:
+        compile_json_patch([{"op": "replace", "path": "/average_rating", "value": 5}])
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        compile_json_patch([{"op": "move", "path": "/name", "from": "/address"}])
+    assert error.value.status_code == 422
+
+
+def test_invalid_pointers():
+    for path in ("name", "/sensory_info/a.b", "/$where"):
+        with pytest.raises(HTTPException):
+            compile_json_patch([{"op": "replace", "path": path, "value": "x"}])
+
+
+def test_merge_patch_sets_walks_objects_and_removes_nulls():
+    compiler = compile_merge_patch({
+        "name": "Merged",
+        "opening_hours": {"monday": None, "tuesday": "09:00-17:00"},
+        "sensory_info": {"noise": {"level": 1}},
+    })
+    # Stages keep the member order; objects under free-form fields are walked to their leaves
+    assert compiler.stages == [
+        {"$set": {"name": {"$literal": "Merged"}}},
+        {"$project": {"opening_hours.monday": 0}},
+        {"$set": {
+            "opening_hours.tuesday": {"$literal": "09:00-17:00"},
+            "sensory_info.noise.level": {"$literal": 1},
+        }},
+    ]
+    assert compiler.touched_fields == {"name", "opening_hours", "sensory_info"}
+
+
+def test_merge_patch_cannot_remove_top_level_fields():
+    with pytest.raises(HTTPException) as error:
+        compile_merge_patch({"name": None})
+    assert error.value.status_code == 422
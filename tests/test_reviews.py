@@ -0,0 +1,54 @@
+import pytest
+
+from server import ReviewStatus, moderation_deltas, review_autism_score, review_totals_match
+
+
+def review(review_id, establishment_id, status, rating=4, staff_helpfulness=5, noise_level="very_low", calm=True):
+    return {
+        "id": review_id, "establishment_id": establishment_id, "status": status, "rating": rating,
+        "staff_helpfulness": staff_helpfulness, "noise_level": noise_level, "calm_areas_available": calm,
+    }
+
+
+def test_autism_score_averages_staff_quietness_and_calm_areas():
+    assert review_autism_score(review("r", "e", "approved")) == pytest.approx((5 + 5 + 5) / 3)
+    assert review_autism_score(review("r", "e", "approved", staff_helpfulness=1, noise_level="very_high", calm=False)) == (
+        pytest.approx((1 + 1 + 1) / 3)
+    )
+
+
+def test_approving_counts_only_reviews_that_were_not_approved():
+    deltas = moderation_deltas([
+        review("r1", "e1", "pending", rating=4),
+        review("r2", "e1", "rejected", rating=2),
+        review("r3", "e1", "approved", rating=5),
+        review("r4", "e2", "pending", rating=3),
+    ], ReviewStatus.APPROVED)
+
+    assert set(deltas) == {"e1", "e2"}
+    assert deltas["e1"]["count"] == 2
+    assert deltas["e1"]["rating_sum"] == 6
+    assert deltas["e2"]["count"] == 1
+
+
+def test_rejecting_removes_only_approved_reviews():
+    deltas = moderation_deltas([
+        review("r1", "e1", "approved", rating=5),
+        review("r2", "e2", "pending", rating=3),
+    ], ReviewStatus.REJECTED)
+
+    assert set(deltas) == {"e1"}
+    assert deltas["e1"]["count"] == -1
+    assert deltas["e1"]["rating_sum"] == -5
+    assert deltas["e1"]["autism_sum"] == pytest.approx(-5.0)
+
+
+def test_moves_between_unapproved_statuses_change_nothing():
+    assert moderation_deltas([review("r1", "e1", "pending")], ReviewStatus.REJECTED) == {}
+
+
+def test_review_totals_match_tolerates_float_noise_but_not_missing_totals():
+    total = {"count": 2, "rating_sum": 7.0, "autism_sum": 0.1 + 0.2}
+    assert review_totals_match({"count": 2, "rating_sum": 7.0, "autism_sum": 0.3}, total)
+    assert not review_totals_match({"count": 1, "rating_sum": 7.0, "autism_sum": 0.3}, total)
+    assert not review_totals_match(None, total)
@@ -0,0 +1,37 @@
+import os
+
+from server import SNAPSHOT_KEPT_VERSIONS, SUPPORTED_ENCODINGS, CatalogueSnapshots, CompressedBody
+
+BODY = b'{"establishments": []}' * 100
+
+
+def test_write_stores_the_body_and_every_variant(tmp_path):
+    snapshots = CatalogueSnapshots(tmp_path / "snapshots")
+    sizes = snapshots.write("0123456789abcdef", CompressedBody(BODY))
+
+    assert snapshots.path("0123456789abcdef").read_bytes() == BODY
+    assert set(sizes) == set(SUPPORTED_ENCODINGS)
+    for encoding, size in sizes.items():
+        assert snapshots.path("0123456789abcdef", encoding).stat().st_size == size
+    assert not list((tmp_path / "snapshots").glob("*.tmp"))
+
+
+def test_a_version_written_by_another_worker_is_reused(tmp_path):
+    first, second = CatalogueSnapshots(tmp_path), CatalogueSnapshots(tmp_path)
+    sizes = first.write("0123456789abcdef", CompressedBody(BODY))
+    assert second.write("0123456789abcdef", CompressedBody(b"ignored")) == sizes
+    assert second.path("0123456789abcdef").read_bytes() == BODY
+
+
+def test_prune_keeps_the_newest_versions_and_the_published_one(tmp_path):
+    snapshots = CatalogueSnapshots(tmp_path)
+    versions = [f"{index:016x}" for index in range(SNAPSHOT_KEPT_VERSIONS + 2)]
+    for age, version in enumerate(reversed(versions)):
+        snapshots.write(version, CompressedBody(BODY))
+        os.utime(snapshots.path(version), (1000 - age, 1000 - age))
+
+    snapshots.prune(keep=versions[0])
+
+    remaining = sorted(path.stem for path in tmp_path.glob("*.json"))
+    assert remaining == sorted([versions[0], *versions[-SNAPSHOT_KEPT_VERSIONS:]])
+    assert not list(tmp_path.glob(f"{versions[1]}.json*"))
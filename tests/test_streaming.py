@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+from pydantic import BaseModel, ValidationError
+
+import server
+from server import stream_documents
+
+
+class Item(BaseModel):
+    id: str
+    rank: int
+
+
+class Cursor:
+    def __init__(self, documents):
+        self._documents = iter(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._documents)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def stream(documents, received=None):
+    """Chunks of the streamed response, appended to received as they arrive"""
+    received = [] if received is None else received
+
+    async def read():
+        response = await stream_documents(Item, Cursor(documents))
+        async for chunk in response.body_iterator:
+            received.append(chunk)
+        return received
+    return asyncio.run(read())
+
+
+def test_streams_a_json_array_in_chunks(monkeypatch):
+    monkeypatch.setattr(server, "STREAM_CHUNK_BYTES", 30)
+    documents = [{"id": f"i{index}", "rank": index} for index in range(5)]
+    chunks = stream(documents)
+
+    assert len(chunks) > 1
+    assert json.loads(b"".join(chunks)) == documents
+    assert json.loads(b"".join(stream([]))) == []
+
+
+def test_invalid_document_in_the_first_chunk_fails_before_the_response():
+    with pytest.raises(ValidationError):
+        stream([{"id": "i0", "rank": 0}, {"id": "i1", "rank": "first"}])
+
+
+def test_invalid_document_after_the_first_chunk_aborts_the_stream(monkeypatch):
+    monkeypatch.setattr(server, "STREAM_CHUNK_BYTES", 30)
+    documents = [{"id": f"i{index}", "rank": index} for index in range(3)] + [{"id": "bad", "rank": "x"}]
+    received = []
+    with pytest.raises(ValidationError):
+        stream(documents, received)
+    assert received and received[0].startswith(b"[")
@@ -0,0 +1,19 @@
+from server import search_key, user_search_fields
+
+
+def test_search_key_folds_case_and_accents():
+    assert search_key("  João Conceição ") == "joao conceicao"
+    assert search_key("ÁLVARO@Exemplo.PT") == "alvaro@exemplo.pt"
+    assert search_key("ﬁlipa") == "filipa"
+
+
+def test_search_key_of_missing_text_is_empty():
+    assert search_key(None) == ""
+    assert search_key("") == ""
+
+
+def test_user_search_fields_only_cover_present_fields():
+    assert user_search_fields({"name": "Inês", "email": "Ines@Mail.pt"}) == {
+        "name_key": "ines", "email_key": "ines@mail.pt",
+    }
+    assert user_search_fields({"email": "a@b.pt"}) == {"email_key": "a@b.pt"}